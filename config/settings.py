@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventory.metrics.MetricsMiddleware',
+    'inventory.querydetector.QueryDetectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,13 +93,156 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+# Selected with DJANGO_DB_ENGINE=sqlite (default) or postgresql.
+
+def env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+
+DB_ENGINE = os.environ.get('DJANGO_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DJANGO_DB_NAME', 'inventory'),
+            'USER': os.environ.get('DJANGO_DB_USER', ''),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DJANGO_DB_HOST', ''),
+            'PORT': os.environ.get('DJANGO_DB_PORT', ''),
+            # Persistent connections, checked before reuse
+            'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Seconds the sqlite3 module waits on a locked database
+                'timeout': int(os.environ.get('DJANGO_SQLITE_BUSY_TIMEOUT_MS', '5000')) / 1000,
+            },
+            # File-backed test database so concurrent tests can use real
+            # SQLite locking instead of the shared-cache in-memory database
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+
+# Applied to every new SQLite connection by inventory.db.configure_sqlite;
+# pragmas set to None are left at SQLite's defaults. The journal mode is
+# stored in the database file, so it is only changed on request: set
+# DJANGO_SQLITE_JOURNAL_MODE=wal on a deployment's own database to let
+# readers run alongside the single writer (NORMAL sync, the default that
+# comes with it, is durable across application crashes in WAL mode).
+# Leave it unset when running against the checked-in db.sqlite3.
+SQLITE_JOURNAL_MODE = os.environ.get('DJANGO_SQLITE_JOURNAL_MODE', '').lower() or None
+
+SQLITE_PRAGMAS = {
+    'journal_mode': SQLITE_JOURNAL_MODE,
+    'synchronous': os.environ.get('DJANGO_SQLITE_SYNCHRONOUS') or ('normal' if SQLITE_JOURNAL_MODE == 'wal' else None),
+    'mmap_size': int(os.environ.get('DJANGO_SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'cache_size': int(os.environ.get('DJANGO_SQLITE_CACHE_SIZE', '-65536')),
+    'temp_store': 'memory',
+}
+
+
+# Cache
+# locmem by default; point DJANGO_CACHE_BACKEND / DJANGO_CACHE_LOCATION at a
+# shared backend (e.g. django.core.cache.backends.redis.RedisCache) in production
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'inventory'),
     }
 }
 
+INVENTORY_RESPONSE_CACHE = 'default'
+INVENTORY_RESPONSE_CACHE_TIMEOUT = 300
+
+# Token -> user resolution cache used by CachedTokenAuthentication.
+# SHARED_CACHE names a CACHES alias to keep resolutions in instead of each
+# process's memory, so logout and deactivation take effect everywhere.
+INVENTORY_TOKEN_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'SHARED_CACHE': None,
+}
+
+
+# Rate limits (inventory.throttling.RouteThrottle). RATES maps URL names
+# from inventory/urls.py to "<requests>/<s|min|hour|day>" budgets, per
+# user or (for anonymous requests) IP address. SHARED_CACHE names a
+# CACHES alias to share budgets across processes; without it each process
+# enforces its own. Turn off with DJANGO_THROTTLING=false for load tests.
+
+INVENTORY_THROTTLING = {
+    'ENABLED': env_flag('DJANGO_THROTTLING', 'true'),
+    'SHARED_CACHE': os.environ.get('DJANGO_THROTTLE_CACHE') or None,
+    'MAX_KEYS': 100000,
+    'RATES': {
+        'login': '10/min',
+        'signup': '20/hour',
+        'change-password': '5/min',
+        'create-sale': '120/min',
+        'bulk-create-sale': '30/min',
+        'import-products': '10/min',
+    },
+}
+
+
+# Per-request instrumentation (inventory.metrics). SAMPLE_RATE is the
+# fraction of requests measured; 0 (the default) removes the middleware
+# entirely. /metrics requires "Authorization: Bearer <AUTH_TOKEN>" when
+# AUTH_TOKEN is set, and a staff session otherwise.
+
+INVENTORY_METRICS = {
+    'SAMPLE_RATE': float(os.environ.get('DJANGO_METRICS_SAMPLE_RATE', '0')),
+    'SERVER_TIMING': env_flag('DJANGO_METRICS_SERVER_TIMING', 'true'),
+    'AUTH_TOKEN': os.environ.get('DJANGO_METRICS_TOKEN', ''),
+}
+
+
+# Database-backed task queue (inventory.tasks), drained by `manage.py run_tasks`.
+# DEFERRED_SALE_EFFECTS lists the sale side effects handed to the queue
+# instead of running in the request: 'rollup' (daily analytics rows),
+# 'cache' (product response cache invalidation) and 'alerts' (low-stock
+# evaluation). Only defer them when a worker is running; until it catches
+# up, analytics, alerts and cached product responses lag behind.
+
+INVENTORY_TASKS = {
+    'DEFERRED_SALE_EFFECTS': [
+        effect for effect in os.environ.get('DJANGO_DEFERRED_SALE_EFFECTS', '').split(',') if effect
+    ],
+    'BATCH_SIZE': 100,
+    'POLL_INTERVAL': 1.0,
+    'LEASE_SECONDS': 300,
+    'MAX_BACKOFF_SECONDS': 300,
+}
+
+# Low-stock alerts (Alert.objects.evaluate). An open alert resolves once
+# stock is back above the threshold by HYSTERESIS_PERCENT (at least one
+# unit), so stock hovering at the threshold does not flap.
+
+INVENTORY_ALERTS = {
+    'HYSTERESIS_PERCENT': 20,
+}
+
+# N+1 and slow-query detection (inventory.querydetector), off unless
+# DJANGO_QUERY_DETECTOR is set: it walks the stack on every query. Requests
+# repeating one query fingerprint REPEAT_THRESHOLD times or running a
+# query over SLOW_MS are logged with the serializer responsible.
+
+INVENTORY_QUERY_DETECTOR = {
+    'ENABLED': env_flag('DJANGO_QUERY_DETECTOR', 'false'),
+    'REPEAT_THRESHOLD': int(os.environ.get('DJANGO_QUERY_DETECTOR_REPEATS', '5')),
+    'SLOW_MS': float(os.environ.get('DJANGO_QUERY_DETECTOR_SLOW_MS', '100')),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -117,6 +263,33 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing (inventory.hashers). DJANGO_PASSWORD_HASHER picks the
+# algorithm for new hashes: pbkdf2, scrypt or argon2 (needs argon2-cffi).
+# The others stay listed so existing hashes still verify; any hash made
+# with another algorithm or other parameters is redone on the user's next
+# successful login.
+
+PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': 'inventory.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'inventory.hashers.ScryptPasswordHasher',
+    'argon2': 'inventory.hashers.Argon2PasswordHasher',
+}
+PASSWORD_HASHER = os.environ.get('DJANGO_PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_PROFILES.items() if name != PASSWORD_HASHER
+]
+
+INVENTORY_PASSWORD_HASHING = {
+    'PBKDF2_ITERATIONS': int(os.environ.get('DJANGO_PBKDF2_ITERATIONS', '720000')),
+    'SCRYPT_WORK_FACTOR': int(os.environ.get('DJANGO_SCRYPT_WORK_FACTOR', str(2 ** 14))),
+    'SCRYPT_BLOCK_SIZE': 8,
+    'SCRYPT_PARALLELISM': 1,
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 102400,
+    'ARGON2_PARALLELISM': 8,
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -134,6 +307,42 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.environ.get('DJANGO_MEDIA_ROOT', BASE_DIR / 'media')
+
+# Spool every upload to a temporary file in chunks instead of holding
+# small ones in memory; saving it to MEDIA_ROOT is then a rename.
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+
+# Product thumbnails (inventory.images), rendered by `manage.py run_tasks`
+# from a task queued with the upload. SYNC renders them inline on commit.
+
+INVENTORY_IMAGES = {
+    'THUMBNAIL_SIZES': {'small': (160, 160), 'medium': (480, 480)},
+    'THUMBNAIL_FORMAT': 'WEBP',
+    'THUMBNAIL_QUALITY': 80,
+    'SYNC': False,
+}
+
+# Streaming exports (inventory.export, /api/export/*, `manage.py export_data`).
+# CHUNK_SIZE rows are fetched and encoded at a time; GZIP_LEVEL trades
+# compression ratio for CPU (1 keeps large exports I/O-bound).
+
+INVENTORY_EXPORT = {
+    'CHUNK_SIZE': 2000,
+    'GZIP_LEVEL': int(os.environ.get('DJANGO_EXPORT_GZIP_LEVEL', '1')),
+}
+
+# Bulk catalog import (inventory.catalog, /api/import-products/,
+# `manage.py import_products`). Each BATCH_SIZE rows are validated and
+# upserted in one transaction; at most MAX_REPORTED_ERRORS row errors are
+# listed in the report (all are counted).
+
+INVENTORY_IMPORT = {
+    'BATCH_SIZE': 1000,
+    'MAX_REPORTED_ERRORS': 1000,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -143,5 +352,17 @@ REST_FRAMEWORK = {
     
     "DEFAULT_PAGINATION_CLASS":  
         "rest_framework.pagination.LimitOffsetPagination",
-    "PAGE_SIZE": 3
-}
\ No newline at end of file
+    "PAGE_SIZE": 3,
+    "DEFAULT_THROTTLE_CLASSES": ["inventory.throttling.RouteThrottle"],
+}
+
+# Stock ledger (inventory.models.StockMovement / StockSnapshot). Every
+# stock change is appended as a movement; `manage.py snapshot_stock`, run
+# periodically (e.g. hourly from cron), stores each changed product's
+# stock so point-in-time reads only sum the movements since. Snapshots
+# are taken SNAPSHOT_LAG_SECONDS in the past so movements in transactions
+# still open at snapshot time are not skipped.
+
+INVENTORY_STOCK_LEDGER = {
+    'SNAPSHOT_LAG_SECONDS': 60,
+}
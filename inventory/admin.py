@@ -5,4 +5,20 @@ from .models import *
 
 admin.site.register(Product)
 admin.site.register(Category)
-admin.site.register(Sale)
\ No newline at end of file
+admin.site.register(Sale)
+admin.site.register(DailyProductSales)
+admin.site.register(Task)
+admin.site.register(Alert)
+admin.site.register(StockSnapshot)
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    # the ledger is append-only; corrections are new adjustments
+    list_display = ['product', 'kind', 'quantity', 'note', 'created_at']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        from . import db, metrics, signals  # noqa: F401
+
+        if metrics.sample_rate() > 0:
+            metrics.install()
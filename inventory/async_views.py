@@ -0,0 +1,123 @@
+"""
+Async versions of the read endpoints.
+
+AsyncAPIView is a DRF APIView whose handlers are coroutines, so under an
+ASGI server a request waiting on a slow client does not hold a worker
+thread. Authentication, permissions and throttling are DRF's own
+initial() with the same classes as the sync views, and the payloads come
+from the same serializers and paginators; since those are sync and may
+wait on the database or a shared cache, they run through sync_to_async.
+Queries with an async ORM API (product detail, analytics) run on the
+event loop. Cached routes share the sync views' versioned response cache
+and ETags.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework import authentication, exceptions, permissions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .authentication import CachedTokenAuthentication
+from .cache import ResponseCacheMixin
+from .models import Product
+from .pagination import ProductCursorPagination, SearchPagination
+from .permissions import IsSalesPersonOrAdmin
+from .search import search_products
+from .serializers import ProductSerializer
+from .views import analytics_queryset, analytics_response, analytics_row, parse_analytics_params
+
+
+class AsyncAPIView(ResponseCacheMixin, APIView):
+    """
+    APIView with an async get(). Set `cache_route` to serve responses
+    through the response cache.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method != "GET":
+                raise exceptions.MethodNotAllowed(request.method)
+            response = await self.cached_get(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        # DRF responses are rendered by Django's handler, off the event loop
+        return self.finalize_response(request, response, *args, **kwargs)
+
+    async def cached_get(self, request, *args, **kwargs):
+        if self.cache_route is None:
+            return await self.get(request, *args, **kwargs)
+        key, etag, response = await sync_to_async(self.lookup_response)(request)
+        if response is not None:
+            return response
+        response = await self.get(request, *args, **kwargs)
+        await sync_to_async(self.store_response)(key, etag, response)
+        return response
+
+
+async def paginated_products(view, request, queryset, paginator):
+    """A page of products in the paginator's own format, as the sync views return it"""
+    def page():
+        products = paginator.paginate_queryset(queryset, request, view=view)
+        data = ProductSerializer(products, many=True, context={"request": request}).data
+        return paginator.get_paginated_response(data)
+    return await sync_to_async(page)()
+
+
+class AsyncProductListView(AsyncAPIView):
+    authentication_classes = [CachedTokenAuthentication, authentication.SessionAuthentication]
+    permission_classes = [IsAuthenticated, permissions.IsAdminUser]
+    cache_route = "products"
+
+    async def get(self, request):
+        return await paginated_products(self, request, Product.objects.all(), ProductCursorPagination())
+
+
+class AsyncProductDetailView(AsyncAPIView):
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    cache_route = "product"
+
+    def get_cache_namespaces(self):
+        return [f"product:{self.kwargs['pk']}"]
+
+    async def get(self, request, pk):
+        try:
+            product = await Product.objects.aget(pk=pk)
+        except Product.DoesNotExist:
+            raise Http404("No Product matches the given query.")
+        return Response(ProductSerializer(product, context={"request": request}).data)
+
+
+class AsyncSearchView(AsyncAPIView):
+    """Ranked search with limit/offset paging, or the newest products without ?searched="""
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    async def get(self, request):
+        searched = request.GET.get("searched")
+        if not searched:
+            return await paginated_products(self, request, Product.objects.all(), ProductCursorPagination())
+        # The index is queried with raw SQL, which has no async API
+        results = await sync_to_async(search_products)(searched)
+        return await paginated_products(self, request, results, SearchPagination())
+
+
+class AsyncSalesAnalyticsView(AsyncAPIView):
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsSalesPersonOrAdmin]
+
+    async def get(self, request):
+        try:
+            start, end, bucket = parse_analytics_params(request.GET)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=400)
+
+        sales = [analytics_row(row) async for row in analytics_queryset(start, end, bucket).aiterator()]
+        return Response(analytics_response(start, end, bucket, sales))
@@ -1,5 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import router
 from rest_framework.authentication import TokenAuthentication as BaseTokenAuth
+from rest_framework.authtoken.models import Token
+
+# The user columns kept per cached token, in the model's column order as
+# Model.from_db() expects; never the password hash. The rest of the row
+# stays deferred and loads on first access.
+CACHED_USER_FIELDS = ("id", "is_superuser", "username", "first_name", "last_name", "email", "is_staff", "is_active")
 
 
 class TokenAuthentication(BaseTokenAuth):
-    keyword = "Bearer"
\ No newline at end of file
+    keyword = "Bearer"
+
+
+def user_values(user):
+    return tuple(getattr(user, name) for name in CACHED_USER_FIELDS)
+
+
+def build_token(key, values):
+    """A fresh Token and User per request, so no two requests share instances"""
+    user = User.from_db(router.db_for_read(User), CACHED_USER_FIELDS, values)
+    token = Token.from_db(router.db_for_read(Token), ["key", "user_id"], [key, user.pk])
+    token.user = user
+    return token
+
+
+class TokenUserCache:
+    """
+    Token key -> the token user's CACHED_USER_FIELDS, with a TTL. get()
+    builds new Token and User instances from the cached values on every
+    call. Entries are dropped explicitly on logout, deactivation and
+    password change.
+
+    Without a shared cache the entries live in a bounded in-process LRU.
+    With SHARED_CACHE they live only in that cache: a process-local copy
+    would keep serving a revoked token in every process but the one that
+    dropped it, so each lookup costs one cache round trip instead.
+    """
+
+    def __init__(self, max_size=10000, ttl=60, shared_cache=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_cache = shared_cache
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def shared(self):
+        return caches[self.shared_cache] if self.shared_cache else None
+
+    def shared_key(self, key):
+        return f"inventory:token:{key}"
+
+    def get(self, key):
+        shared = self.shared()
+        if shared:
+            values = shared.get(self.shared_key(key))
+        else:
+            values = self.get_local(key)
+        with self.lock:
+            if values is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return build_token(key, values)
+
+    def get_local(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires <= now:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return values
+
+    def set(self, key, token):
+        values = user_values(token.user)
+        shared = self.shared()
+        if shared:
+            shared.set(self.shared_key(key), values, self.ttl)
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, values)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        shared = self.shared()
+        if shared:
+            shared.delete_many([self.shared_key(key) for key in keys])
+
+    def delete_user(self, user_id):
+        """Drop every in-process entry for a user (shared entries are dropped by key)"""
+        with self.lock:
+            for key in [key for key, (_, values) in self.entries.items() if values[0] == user_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "max_size": self.max_size}
+
+
+def build_token_cache():
+    options = getattr(settings, "INVENTORY_TOKEN_CACHE", {})
+    return TokenUserCache(
+        max_size=options.get("MAX_SIZE", 10000),
+        ttl=options.get("TTL", 60),
+        shared_cache=options.get("SHARED_CACHE"),
+    )
+
+
+token_cache = build_token_cache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Bearer token authentication that resolves tokens through token_cache,
+    only joining Token and User on a miss.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is not None and token.user.is_active:
+            return (token.user, token)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, token)
+        return (user, token)
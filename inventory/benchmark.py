@@ -0,0 +1,168 @@
+"""
+Scripted API workloads for comparing performance across commits.
+
+Each workload builds one request (method, path, body) from a Dataset of
+ids sampled from the database with a seeded generator, so two runs over
+the same seeded data send the same requests. run_in_process drives the
+workloads through Django's test client and counts queries with
+CaptureQueriesContext; run_http replays them against a running server
+and reads the query count from the Server-Timing header MetricsMiddleware
+adds. Both report latency percentiles, throughput and queries per request
+per route.
+
+Requests carry both a Bearer token and a session for the same staff user,
+since some routes only accept one of the two.
+"""
+import asyncio
+import json
+import random
+import re
+import statistics
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import get_cache
+from .loadtest import request, summarize
+from .models import Category
+from .seed import WORDS
+from .views import ANALYTICS_BUCKETS
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class Dataset:
+    """Sellable (category, product, price) rows and the generator picking among them"""
+
+    def __init__(self, random_seed=0, sample_size=1000):
+        self.rng = random.Random(random_seed)
+        self.catalog = list(
+            Category.objects.order_by("pk").values_list("pk", "product_id", "product__price")[:sample_size]
+        )
+        if not self.catalog:
+            raise ValueError("No categorized products to benchmark against; seed some data first")
+
+    def product_id(self):
+        return self.rng.choice(self.catalog)[1]
+
+    def sale(self):
+        category_id, product_id, price = self.rng.choice(self.catalog)
+        return {"product": product_id, "category": category_id, "quantity_sold": 1, "unit_price": str(price)}
+
+    def search_term(self):
+        return self.rng.choice(WORDS)
+
+    def analytics_query(self):
+        start = timezone.localdate() - timedelta(days=self.rng.randint(30, 365))
+        end = start + timedelta(days=30)
+        bucket = self.rng.choice(list(ANALYTICS_BUCKETS))
+        return f"?start={start}&end={end}&bucket={bucket}"
+
+
+WORKLOADS = {
+    "list": lambda data: ("GET", reverse("list"), None),
+    "detail": lambda data: ("GET", reverse("detail", args=[data.product_id()]), None),
+    "search": lambda data: ("GET", f"{reverse('search-product')}?searched={data.search_term()}", None),
+    "list-category": lambda data: ("GET", reverse("list-category"), None),
+    "list-sale": lambda data: ("GET", reverse("list-sale"), None),
+    "analytics": lambda data: ("GET", reverse("sales") + data.analytics_query(), None),
+    "create-sale": lambda data: ("POST", reverse("create-sale"), data.sale()),
+    "bulk-create-sale": lambda data: ("POST", reverse("bulk-create-sale"), [data.sale() for _ in range(20)]),
+    "async-list": lambda data: ("GET", reverse("async-list"), None),
+    "async-detail": lambda data: ("GET", reverse("async-detail", args=[data.product_id()]), None),
+    "async-search": lambda data: (
+        "GET", f"{reverse('async-search-product')}?searched={data.search_term()}", None),
+    "async-analytics": lambda data: ("GET", reverse("async-sales") + data.analytics_query(), None),
+}
+
+
+def query_stats(counts):
+    return {
+        "queries_per_request": round(statistics.fmean(counts), 2) if counts else None,
+        "max_queries": max(counts) if counts else None,
+    }
+
+
+def session_cookie(user):
+    """Log `user` in server-side and return the Cookie header for it"""
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+
+def run_in_process(routes, dataset, iterations, token, cold=False):
+    """Time `iterations` requests per route through the test client"""
+    client = Client(HTTP_AUTHORIZATION=f"Bearer {token.key}")
+    client.force_login(token.user)
+    report = {}
+    for name in routes:
+        build = WORKLOADS[name]
+        latencies, counts, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            method, path, body = build(dataset)
+            if cold:
+                get_cache().clear()
+            payload = json.dumps(body) if body is not None else ""
+            with CaptureQueriesContext(connection) as queries:
+                sent = time.perf_counter()
+                response = client.generic(method, path, payload, content_type="application/json")
+                elapsed = time.perf_counter() - sent
+            counts.append(len(queries))
+            if response.status_code < 400:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+        report[name] = {**summarize(latencies, errors, time.perf_counter() - started), **query_stats(counts)}
+    return report
+
+
+async def run_http(base_url, routes, dataset, clients, iterations, token):
+    """Replay the workloads with `clients` concurrent clients against a running server"""
+    headers = {
+        "Authorization": f"Bearer {token.key}",
+        "Cookie": await sync_to_async(session_cookie)(token.user),
+        "Content-Type": "application/json",
+    }
+    report = {}
+    for name in routes:
+        build = WORKLOADS[name]
+        latencies, counts = [], []
+        errors = 0
+
+        async def client():
+            nonlocal errors
+            for _ in range(iterations):
+                method, path, body = build(dataset)
+                payload = json.dumps(body).encode() if body is not None else None
+                sent = time.perf_counter()
+                try:
+                    status, response_headers, _ = await request(
+                        base_url.rstrip("/") + path, method, payload, headers)
+                except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                    errors += 1
+                    continue
+                if status >= 400 or not status:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - sent)
+                match = SERVER_TIMING_QUERIES.search(response_headers.get("server-timing", ""))
+                if match:
+                    counts.append(int(match.group(1)))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        report[name] = {**summarize(latencies, errors, time.perf_counter() - started), **query_stats(counts)}
+    return report
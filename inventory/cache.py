@@ -0,0 +1,123 @@
+"""
+Response cache for the read-heavy product and category endpoints.
+
+Cached payloads live under keys that embed a version number per
+namespace ("products", "product:<pk>", "categories"). Writes bump the
+versions they affect, so stale entries are simply never looked up again
+and expire on their own. The same versions make up the ETag, so a
+matching If-None-Match is answered with a 304 before any serializing.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .pagination import wants_stream
+
+KEY_PREFIX = "inventory"
+
+
+def get_cache():
+    return caches[getattr(settings, "INVENTORY_RESPONSE_CACHE", "default")]
+
+
+def version_key(namespace):
+    return f"{KEY_PREFIX}:version:{namespace}"
+
+
+def get_versions(namespaces):
+    cache = get_cache()
+    keys = [version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Seed from the clock so an evicted version never repeats
+            cache.add(key, time.time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*namespaces):
+    """
+    Bump namespace versions once the current transaction commits, so a
+    concurrent read cannot cache pre-commit data under the new version.
+    """
+    def bump():
+        cache = get_cache()
+        for namespace in namespaces:
+            key = version_key(namespace)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def invalidate_product(product_id):
+    """A product's own row changed: its detail, the product list and nested categories"""
+    invalidate("products", f"product:{product_id}", "categories")
+
+
+def invalidate_products(product_ids):
+    """invalidate_product for many products, bumping the shared namespaces once"""
+    invalidate("products", "categories", *(f"product:{product_id}" for product_id in product_ids))
+
+
+def invalidate_categories():
+    invalidate("categories")
+
+
+class ResponseCacheMixin:
+    """
+    Versioned response cache lookups for a view. Set `cache_route` and
+    override get_cache_namespaces() to name the data the response depends
+    on. CachedResponseMixin wires it into sync GETs; the async views call
+    it through sync_to_async.
+    """
+    cache_route = None
+
+    def get_cache_namespaces(self):
+        return [self.cache_route]
+
+    def get_cache_tag(self, request):
+        versions = get_versions(self.get_cache_namespaces())
+        raw = "|".join([self.cache_route, request.get_host(), request.get_full_path(), *map(str, versions)])
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def lookup_response(self, request):
+        """(key, etag, response): a 304, the cached payload, or None on a miss"""
+        tag = self.get_cache_tag(request)
+        etag = f'"{tag}"'
+        key = f"{KEY_PREFIX}:response:{tag}"
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return key, etag, Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        data = get_cache().get(key)
+        if data is not None:
+            return key, etag, Response(data, headers={"ETag": etag})
+        return key, etag, None
+
+    def store_response(self, key, etag, response):
+        if response.status_code == status.HTTP_200_OK:
+            get_cache().set(key, response.data, getattr(settings, "INVENTORY_RESPONSE_CACHE_TIMEOUT", 300))
+            response["ETag"] = etag
+
+
+class CachedResponseMixin(ResponseCacheMixin):
+    """GET mixin for generic views, see ResponseCacheMixin"""
+
+    def get(self, request, *args, **kwargs):
+        if wants_stream(request):
+            return super().get(request, *args, **kwargs)
+
+        key, etag, response = self.lookup_response(request)
+        if response is not None:
+            return response
+        response = super().get(request, *args, **kwargs)
+        self.store_response(key, etag, response)
+        return response
@@ -0,0 +1,298 @@
+"""
+Bulk product catalog import.
+
+Rows come from CSV, NDJSON or a JSON array and are read as a stream, so
+a file of any size is held BATCH_SIZE rows at a time. Each batch is
+validated column by column with the model fields' own clean() (plus the
+API's rule that prices are positive) and then written in one
+transaction:
+
+- products are matched on `sku`; rows for unknown SKUs are created and
+  the others update only the columns present in the row,
+- one INSERT ... ON CONFLICT (sku) DO UPDATE writes the whole batch,
+- the search index, response cache and low-stock alerts are refreshed
+  and stock changes are recorded in the stock ledger for the batch in
+  bulk, since bulk writes send no model signals.
+
+A SKU repeated within a batch ends up with its last row's values, as it
+would across batches. Rows that fail are reported by their 0-based index
+in the input without holding back the rest.
+"""
+import codecs
+import csv
+import json
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from . import cache, search
+from .models import Alert, Product, StockMovement
+
+IMPORT_FIELDS = ("sku", "product_name", "description", "price", "stock_quantity", "reorder_threshold")
+REQUIRED_FIELDS = ("product_name", "price")
+UPDATE_FIELDS = IMPORT_FIELDS[1:]
+FORMATS = ("csv", "ndjson", "json")
+READ_SIZE = 64 * 1024
+MAX_ROW_SIZE = 1024 * 1024
+
+
+def get_options():
+    return getattr(settings, "INVENTORY_IMPORT", {})
+
+
+class InvalidRow:
+    """A row that could not be parsed; reported instead of validated"""
+
+    def __init__(self, message):
+        self.message = message
+
+
+# Readers: byte stream -> rows (dicts or InvalidRow)
+
+def read_csv(stream):
+    for row in csv.DictReader(codecs.iterdecode(stream, "utf-8-sig")):
+        if None in row:
+            yield InvalidRow("More values than columns")
+        else:
+            yield row
+
+
+def read_ndjson(stream):
+    for line in codecs.iterdecode(stream, "utf-8-sig"):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line, parse_float=Decimal)
+        except ValueError as exc:
+            yield InvalidRow(f"Invalid JSON: {exc}")
+            continue
+        yield row if isinstance(row, dict) else InvalidRow("Expected an object")
+
+
+def read_json(stream):
+    """Decode a JSON array of objects one element at a time"""
+    decoder = json.JSONDecoder(parse_float=Decimal)
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer, position, started, done = "", 0, False, False
+
+    for data in iter(lambda: stream.read(READ_SIZE), b""):
+        buffer = buffer[position:] + text_decoder.decode(data)
+        position = 0
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or (started and buffer[position] == ",")):
+                position += 1
+            if position == len(buffer) or done:
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                done = True
+                position += 1
+                continue
+            try:
+                row, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # most likely cut off at the end of this read
+                if len(buffer) - position > MAX_ROW_SIZE:
+                    raise ValueError(f"Invalid JSON, or an element over {MAX_ROW_SIZE} bytes")
+                break
+            position = end
+            yield row if isinstance(row, dict) else InvalidRow("Expected an object")
+    if not done or buffer[position:].strip():
+        raise ValueError("Invalid or truncated JSON array")
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson, "json": read_json}
+
+
+# Validation
+
+def clean_price(value):
+    if value <= 0:
+        raise ValidationError("Price must be greater than zero")
+    return value
+
+
+EXTRA_CLEANERS = {"price": clean_price}
+
+
+def clean_batch(rows):
+    """
+    Validate a batch of (index, row) pairs column by column.
+    Returns ({index: values}, {index: errors}).
+    """
+    values = {}
+    errors = {}
+    for index, row in rows:
+        if isinstance(row, InvalidRow):
+            errors[index] = {"row": [row.message]}
+        else:
+            values[index] = {}
+
+    for name in IMPORT_FIELDS:
+        field = Product._meta.get_field(name)
+        extra = EXTRA_CLEANERS.get(name)
+        for index, row in rows:
+            if index not in values or (name not in row and name != "sku"):
+                continue
+            raw = row.get(name)
+            if isinstance(raw, str):
+                raw = raw.strip()
+            if raw in ("", None):
+                if name == "sku" or name in REQUIRED_FIELDS:
+                    errors.setdefault(index, {})[name] = ["This field is required."]
+                elif field.null:
+                    values[index][name] = None
+                # a blank stock_quantity leaves it unchanged
+                continue
+            try:
+                value = field.clean(raw, None)
+                values[index][name] = extra(value) if extra else value
+            except ValidationError as exc:
+                errors.setdefault(index, {})[name] = exc.messages
+
+    for index in errors:
+        values.pop(index, None)
+    return values, errors
+
+
+# Writing
+
+def upsert(values):
+    """
+    Create or update products from {index: cleaned values}; returns
+    ({index: (product id, created)}, {index: errors}).
+    """
+    # the last row for a SKU wins; earlier ones share its outcome
+    by_sku, superseded = {}, {}
+    for index, row in values.items():
+        earlier = by_sku.pop(row["sku"], None)
+        if earlier is not None:
+            superseded[earlier] = index
+        by_sku[row["sku"]] = index
+    existing = {
+        product.sku: product
+        # locked, so the ledger's stock deltas are against what is overwritten
+        for product in Product.objects.filter(sku__in=list(by_sku)).select_for_update().only(*IMPORT_FIELDS)
+    }
+
+    results, errors, groups, movements = {}, {}, {}, []
+    for sku, index in by_sku.items():
+        row = values[index]
+        current = existing.get(sku)
+        update_fields = tuple(name for name in UPDATE_FIELDS if name in row)
+        if current is None:
+            missing = [name for name in REQUIRED_FIELDS if name not in row]
+            if missing:
+                errors[index] = {name: ["Required for new products."] for name in missing}
+                continue
+            product = Product(**{"stock_quantity": 0, **row})
+        elif not update_fields:
+            results[index] = (current.pk, False)
+            continue
+        else:
+            # the INSERT half of the upsert needs every NOT NULL column
+            product = Product(**{**{name: getattr(current, name) for name in IMPORT_FIELDS}, **row})
+        groups.setdefault(update_fields, []).append((index, current is None, product))
+
+    for update_fields, entries in groups.items():
+        products = [product for _, _, product in entries]
+        Product.objects.bulk_create(
+            products, update_conflicts=True, unique_fields=["sku"], update_fields=list(update_fields),
+        )
+        for index, created, product in entries:
+            results[index] = (product.pk, created)
+            current = existing.get(product.sku)
+            change = product.stock_quantity - (0 if created else current.stock_quantity)
+            if created or change:
+                movements.append(StockMovement(
+                    product_id=product.pk,
+                    kind=StockMovement.RESTOCK if change > 0 and not created else StockMovement.ADJUSTMENT,
+                    quantity=change,
+                    note='Opening stock' if created else 'Stock imported',
+                ))
+        refresh(products, update_fields)
+    StockMovement.objects.bulk_create(movements)
+
+    # earlier rows first, so a chain of repeats resolves to the final row
+    for earlier in sorted(superseded, reverse=True):
+        final = superseded[earlier]
+        if final in errors:
+            errors[earlier] = errors[final]
+        else:
+            product_id, created = results[final]
+            results[earlier], results[final] = (product_id, created), (product_id, False)
+    return results, errors
+
+
+def refresh(products, update_fields):
+    """Do for a batch what the Product post_save signals do for one product"""
+    if {"product_name", "description"} & set(update_fields):
+        search.index_rows(
+            search.get_connection(),
+            [(product.pk, product.product_name, product.description) for product in products],
+        )
+    cache.invalidate_products(product.pk for product in products)
+    if {"stock_quantity", "reorder_threshold"} & set(update_fields):
+        Alert.objects.evaluate(product.pk for product in products)
+
+
+def write_batch(values):
+    """Upsert one batch in a transaction; if the database rejects it, isolate the failing rows"""
+    try:
+        with transaction.atomic():
+            return upsert(values)
+    except DatabaseError:
+        pass
+    results, errors = {}, {}
+    for index, row in values.items():
+        try:
+            with transaction.atomic():
+                done, failed = upsert({index: row})
+        except DatabaseError as exc:
+            done, failed = {}, {index: {"row": [str(exc)]}}
+        results.update(done)
+        errors.update(failed)
+    return results, errors
+
+
+def import_products(stream, file_format, batch_size=None):
+    """
+    Import products from a binary stream in `file_format` (csv, ndjson or
+    json). Returns counts and up to MAX_REPORTED_ERRORS row errors. If the
+    input turns out to be unreadable part way, the batches before that
+    point stay imported and "error" says why the rest was not.
+    """
+    options = get_options()
+    batch_size = batch_size or options.get("BATCH_SIZE", 1000)
+    max_errors = options.get("MAX_REPORTED_ERRORS", 1000)
+    report = {"created": 0, "updated": 0, "failed": 0, "errors": []}
+
+    rows = enumerate(READERS[file_format](stream))
+    while True:
+        try:
+            batch = list(islice(rows, batch_size))
+        except (ValueError, csv.Error) as exc:
+            # includes UnicodeDecodeError
+            report["error"] = f"Could not read the {file_format} input: {exc}"
+            return report
+        if not batch:
+            return report
+        values, errors = clean_batch(batch)
+        if values:
+            results, write_errors = write_batch(values)
+            errors.update(write_errors)
+            for _, created in results.values():
+                report["created" if created else "updated"] += 1
+        report["failed"] += len(errors)
+        for index in sorted(errors):
+            if len(report["errors"]) < max_errors:
+                report["errors"].append({"index": index, "errors": errors[index]})
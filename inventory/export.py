@@ -0,0 +1,174 @@
+"""
+Streaming CSV and NDJSON exports of sales and products.
+
+Rows are projected with values_list() and fetched CHUNK_SIZE at a time
+through a chunked (on PostgreSQL, server-side) cursor, then encoded a
+chunk at a time, so memory stays flat however many rows are exported.
+The raw database values are formatted directly: Django's row converters
+(parsing every datetime and decimal into Python objects only for them to
+be turned back into text) took most of the CPU time of an export. gzip
+output is deflated chunk by chunk at a low level by default, so a large
+export is limited by the disk or the network rather than by compression.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models
+from django.db.models.sql.constants import MULTI
+
+from .models import Product, Sale, day_start
+
+# kind -> (model, lookup filtered by ?product=, (column, lookup) pairs)
+EXPORTS = {
+    "sales": (Sale, "product_id", (
+        ("id", "id"),
+        ("product", "product_id"),
+        ("product_name", "product__product_name"),
+        ("category", "category_id"),
+        ("date", "date"),
+        ("quantity_sold", "quantity_sold"),
+        ("unit_price", "unit_price"),
+        ("total_sale", "total_sale"),
+    )),
+    "products": (Product, "id", (
+        ("id", "id"),
+        ("sku", "sku"),
+        ("product_name", "product_name"),
+        ("price", "price"),
+        ("stock_quantity", "stock_quantity"),
+        ("units_sold", "units_sold"),
+        ("reorder_threshold", "reorder_threshold"),
+        ("date", "date"),
+    )),
+}
+
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def get_options():
+    return getattr(settings, "INVENTORY_EXPORT", {})
+
+
+def parse_filters(params):
+    """
+    Read product=<id>, start=YYYY-MM-DD and end=YYYY-MM-DD (inclusive).
+    Raises ValueError with a client-facing message.
+    """
+    try:
+        return {
+            "product": int(params["product"]) if params.get("product") else None,
+            "start": date.fromisoformat(params["start"]) if params.get("start") else None,
+            "end": date.fromisoformat(params["end"]) if params.get("end") else None,
+        }
+    except ValueError:
+        raise ValueError("start and end must be YYYY-MM-DD and product an id")
+
+
+def export_queryset(kind, product=None, start=None, end=None):
+    model, product_lookup, columns = EXPORTS[kind]
+    queryset = model.objects.all()
+    if product is not None:
+        queryset = queryset.filter(**{product_lookup: product})
+    if start:
+        queryset = queryset.filter(date__gte=day_start(start))
+    if end:
+        queryset = queryset.filter(date__lt=day_start(end + timedelta(days=1)))
+    return queryset.order_by("pk").values_list(*(lookup for _, lookup in columns))
+
+
+def format_datetime(value):
+    if isinstance(value, datetime) and value.tzinfo is None and settings.USE_TZ:
+        # SQLite hands back the stored UTC value without its zone
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat() if value is not None else None
+
+
+def decimal_formatter(places):
+    def format_decimal(value):
+        if value is None:
+            return None
+        if isinstance(value, Decimal):
+            return str(value)
+        # SQLite stores decimals as REAL or INTEGER
+        return f"{value:.{places}f}"
+    return format_decimal
+
+
+def column_formatters(kind):
+    """(index, formatter) for the columns whose raw values need formatting"""
+    model, _, columns = EXPORTS[kind]
+    formatters = []
+    for index, (_, lookup) in enumerate(columns):
+        *path, name = lookup.split("__")
+        opts = model._meta
+        for part in path:
+            opts = opts.get_field(part).related_model._meta
+        field = opts.get_field(name)
+        if isinstance(field, models.DateTimeField):
+            formatters.append((index, format_datetime))
+        elif isinstance(field, models.DecimalField):
+            formatters.append((index, decimal_formatter(field.decimal_places)))
+    return formatters
+
+
+def raw_chunks(queryset, chunk_size):
+    """Lists of unconverted row tuples, read with a chunked cursor like .iterator()"""
+    compiler = queryset.query.get_compiler(using=queryset.db)
+    return compiler.execute_sql(MULTI, chunked_fetch=True, chunk_size=chunk_size)
+
+
+def encode_csv(header, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_ndjson(header, chunks):
+    encoder = json.JSONEncoder(default=str)
+    for chunk in chunks:
+        yield "".join(encoder.encode(dict(zip(header, row))) + "\n" for row in chunk)
+
+
+ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson}
+
+
+def export_chunks(kind, output="csv", chunk_size=None, **filters):
+    """Yield the export as UTF-8 byte strings of up to chunk_size rows each"""
+    chunk_size = chunk_size or get_options().get("CHUNK_SIZE", 2000)
+    header = [column for column, _ in EXPORTS[kind][2]]
+    formatters = column_formatters(kind)
+    queryset = export_queryset(kind, **filters)
+
+    def chunks():
+        for chunk in raw_chunks(queryset, chunk_size):
+            chunk = [list(row) for row in chunk]
+            for row in chunk:
+                for index, formatter in formatters:
+                    row[index] = formatter(row[index])
+            yield chunk
+
+    for text in ENCODERS[output](header, chunks()):
+        if text:
+            yield text.encode()
+
+
+def gzip_chunks(chunks, level=None):
+    """Compress a byte stream into one gzip member without buffering it"""
+    level = get_options().get("GZIP_LEVEL", 1) if level is None else level
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,58 @@
+"""
+Password hashers whose cost parameters come from settings.
+
+Django's hashers hard-code their parameters as class attributes. These
+read them from INVENTORY_PASSWORD_HASHING instead, so the cost can be
+tuned per deployment. Because must_update() compares a stored hash's
+parameters against the current ones, a hash made with other parameters
+(or another listed algorithm) is re-made on the user's next successful
+login, when check_password() has the plain password.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def get_option(name, default):
+    return getattr(settings, "INVENTORY_PASSWORD_HASHING", {}).get(name, default)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return get_option("PBKDF2_ITERATIONS", hashers.PBKDF2PasswordHasher.iterations)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return get_option("SCRYPT_WORK_FACTOR", hashers.ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return get_option("SCRYPT_BLOCK_SIZE", hashers.ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return get_option("SCRYPT_PARALLELISM", hashers.ScryptPasswordHasher.parallelism)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Needs argon2-cffi"""
+
+    @property
+    def time_cost(self):
+        return get_option("ARGON2_TIME_COST", hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return get_option("ARGON2_MEMORY_COST", hashers.Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return get_option("ARGON2_PARALLELISM", hashers.Argon2PasswordHasher.parallelism)
+
+
+def hasher_list(profile):
+    """PASSWORD_HASHERS preferring `profile` (a key of PASSWORD_HASHER_PROFILES)"""
+    profiles = settings.PASSWORD_HASHER_PROFILES
+    return [profiles[profile]] + [path for name, path in profiles.items() if name != profile]
@@ -0,0 +1,106 @@
+"""
+Product image storage and thumbnails.
+
+Uploads go through ContentAddressedStorage: the file is hashed chunk by
+chunk and stored under its SHA-256, so uploading the same picture again
+reuses the stored file instead of writing a copy. Uploads are spooled to
+a temporary file by TemporaryFileUploadHandler, so the final save is a
+rename rather than a copy of the whole body.
+
+Thumbnails are rendered off the request by a "products.thumbnails" task,
+queued in the product's transaction (see inventory.tasks), so they
+survive a restart and are retried if rendering fails. generate_thumbnails
+writes one image per configured size (content-addressed as well) and
+records the paths in Product.image_variants for every product using that
+original.
+"""
+import hashlib
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+from PIL import Image, ImageOps
+
+from .cache import invalidate_product
+
+DEFAULT_THUMBNAIL_SIZES = {"small": (160, 160), "medium": (480, 480)}
+
+
+def get_options():
+    return getattr(settings, "INVENTORY_IMAGES", {})
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores files as <upload dir>/<hash[:2]>/<hash><ext>; identical content is written once"""
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        hexdigest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = "/".join(part for part in (directory, hexdigest[:2], hexdigest + extension) if part)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+product_image_storage = ContentAddressedStorage()
+
+
+def render_thumbnail(source, size, image_format, quality):
+    with Image.open(source) as image:
+        # lets JPEG decode at a reduced scale instead of full resolution
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, quality=quality)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_thumbnails(name):
+    """Render every thumbnail size of the stored image `name` and attach them to its products"""
+    from .models import Product
+
+    products = Product.objects.filter(image=name)
+    # another product with the same upload may already have them
+    variants = products.filter(image_variants__source=name).values_list("image_variants", flat=True).first()
+    if variants is None:
+        options = get_options()
+        image_format = options.get("THUMBNAIL_FORMAT", "WEBP")
+        quality = options.get("THUMBNAIL_QUALITY", 80)
+        variants = {"source": name}
+        for variant, size in options.get("THUMBNAIL_SIZES", DEFAULT_THUMBNAIL_SIZES).items():
+            with product_image_storage.open(name) as source:
+                thumbnail = render_thumbnail(source, tuple(size), image_format, quality)
+            variants[variant] = product_image_storage.save(
+                f"thumbnails/{variant}.{image_format.lower()}", thumbnail
+            )
+
+    product_ids = list(products.values_list("pk", flat=True))
+    Product.objects.filter(pk__in=product_ids, image=name).update(image_variants=variants)
+    # update() sends no signals
+    for product_id in product_ids:
+        invalidate_product(product_id)
+    return variants
+
+
+def schedule_thumbnails(name):
+    """Generate thumbnails for `name` in the background once the current transaction commits"""
+    if get_options().get("SYNC", False):
+        transaction.on_commit(lambda: generate_thumbnails(name))
+        return
+    from . import tasks
+
+    tasks.enqueue("products.thumbnails", {"name": name})
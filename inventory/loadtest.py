@@ -0,0 +1,96 @@
+"""
+Dependency-free HTTP load generator used by the load-test commands.
+
+Each simulated client opens its own connection per request with asyncio
+streams, so thousands of concurrent clients cost one process.
+"""
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, elapsed):
+    """Latency percentiles in ms and throughput in requests per second"""
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+    }
+
+
+async def request(url, method="GET", body=None, headers=None, read_delay=0.0, timeout=30.0):
+    """Send one request and return (status, headers, body); header names are lowercased"""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port, ssl=parts.scheme == "https"), timeout
+    )
+    try:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + (body or b""))
+        await writer.drain()
+        chunks = []
+        while True:
+            chunk = await asyncio.wait_for(reader.read(16384), timeout)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if read_delay:
+                await asyncio.sleep(read_delay)
+        response = b"".join(chunks)
+        head, _, content = response.partition(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        status = int(status_line.split(" ", 2)[1]) if response else 0
+        response_headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        return status, response_headers, content
+    finally:
+        writer.close()
+
+
+async def fetch(url, headers=None, read_delay=0.0, timeout=30.0):
+    """GET `url` and return (status, body); read_delay simulates a slow reader"""
+    status, _, body = await request(url, headers=headers, read_delay=read_delay, timeout=timeout)
+    return status, body
+
+
+async def run_load(url, clients, requests_per_client, headers=None, read_delay=0.0):
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            try:
+                status, _ = await fetch(url, headers=headers, read_delay=read_delay)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                errors += 1
+                continue
+            if 200 <= status < 400:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return summarize(latencies, errors, time.perf_counter() - started)
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import subprocess
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.authtoken.models import Token
+
+from inventory.benchmark import WORKLOADS, Dataset, run_http, run_in_process
+from inventory.seed import seed
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Run scripted workloads against the API routes and print latency percentiles, throughput "
+        "and queries per request as JSON. In-process mode builds, seeds and drops a throwaway "
+        "test database; http mode targets a running server and its existing data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+        parser.add_argument("--routes", default=",".join(WORKLOADS),
+                            help="Comma-separated workloads (default: all)")
+        parser.add_argument("--iterations", type=int, default=50, help="Requests per route (per client in http mode)")
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--categories", type=int, help="Defaults to one per product")
+        parser.add_argument("--sales", type=int, default=10000)
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--random-seed", type=int, default=0)
+        parser.add_argument("--cold", action="store_true",
+                            help="Clear the response cache before every in-process request")
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000",
+                            help="Server root for http mode")
+        parser.add_argument("--token", help="Token key of a staff user (required in http mode)")
+        parser.add_argument("--clients", type=int, default=10, help="Concurrent clients in http mode")
+        parser.add_argument("--seed", action="store_true",
+                            help="In http mode, first seed the configured database (writes to it)")
+        parser.add_argument("--output", help="Also write the report to this file")
+
+    def handle(self, *args, **options):
+        routes = [name.strip() for name in options["routes"].split(",") if name.strip()]
+        unknown = sorted(set(routes) - set(WORKLOADS))
+        if unknown:
+            raise CommandError(f"Unknown workloads: {', '.join(unknown)}")
+
+        dataset_options = {
+            "products": options["products"],
+            "categories": options["categories"],
+            "sales": options["sales"],
+            "days": options["days"],
+            "random_seed": options["random_seed"],
+        }
+        if options["mode"] == "inprocess":
+            routes_report, created = self.run_in_process(routes, dataset_options, options)
+        else:
+            routes_report, created = self.run_http(routes, dataset_options, options)
+
+        report = {
+            "revision": git_revision(),
+            "mode": options["mode"],
+            "database": connection.vendor,
+            "dataset": created,
+            "random_seed": options["random_seed"],
+            "iterations": options["iterations"],
+            "routes": routes_report,
+        }
+        if options["mode"] == "http":
+            report["clients"] = options["clients"]
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                handle.write(output + "\n")
+        self.stdout.write(output)
+
+    def run_in_process(self, routes, dataset_options, options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        # The N+1 detector walks the stack on every query; keep it out of the timings.
+        # Rate limits would turn the write workloads into 429s.
+        detector = {**getattr(settings, "INVENTORY_QUERY_DETECTOR", {}), "ENABLED": False}
+        throttling = {**getattr(settings, "INVENTORY_THROTTLING", {}), "ENABLED": False}
+        try:
+            created = seed(**dataset_options)
+            user = User.objects.create_user("benchmark", password=None, is_staff=True, is_superuser=True)
+            token = Token.objects.create(user=user)
+            dataset = Dataset(options["random_seed"])
+            with override_settings(INVENTORY_QUERY_DETECTOR=detector, INVENTORY_THROTTLING=throttling):
+                report = run_in_process(routes, dataset, options["iterations"], token, cold=options["cold"])
+            return report, created
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run_http(self, routes, dataset_options, options):
+        if not options["token"]:
+            raise CommandError("--token is required in http mode")
+        try:
+            token = Token.objects.select_related("user").get(key=options["token"])
+        except Token.DoesNotExist:
+            raise CommandError("--token does not match a token in the configured database")
+        created = seed(**dataset_options) if options["seed"] else None
+        try:
+            dataset = Dataset(options["random_seed"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        report = asyncio.run(run_http(
+            options["base_url"], routes, dataset, options["clients"], options["iterations"], token,
+        ))
+        return report, created
@@ -0,0 +1,87 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from inventory.hashers import hasher_list
+from inventory.serializers import UserSerializer
+
+PASSWORD = "correct-horse-battery-staple"
+
+
+def rate(count, elapsed):
+    return round(count / elapsed, 2) if elapsed else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure signups and logins per second on one core for each password hasher profile, "
+        "in a throwaway test database. Also times the previous signup path, which hashed twice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", default="pbkdf2,scrypt",
+                            help=f"Comma-separated profiles from: {', '.join(settings.PASSWORD_HASHER_PROFILES)}")
+        parser.add_argument("--users", type=int, default=20, help="Signups (and logins) per profile")
+
+    def handle(self, *args, **options):
+        profiles = [name for name in options["profiles"].split(",") if name]
+        unknown = sorted(set(profiles) - set(settings.PASSWORD_HASHER_PROFILES))
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(unknown)}")
+
+        throttling = {**getattr(settings, "INVENTORY_THROTTLING", {}), "ENABLED": False}
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = {}
+            for profile in profiles:
+                with override_settings(PASSWORD_HASHERS=hasher_list(profile), INVENTORY_THROTTLING=throttling):
+                    report[profile] = self.measure(profile, options["users"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def measure(self, profile, users):
+        client = Client()
+        names = [f"{profile}-user-{n}" for n in range(users)]
+
+        started = time.perf_counter()
+        for name in names:
+            response = client.post(reverse("signup"), {"username": name, "password": PASSWORD,
+                                                       "first_name": "Bench", "last_name": "User"})
+            if response.status_code != 201:
+                raise CommandError(f"Signup failed: {response.status_code} {response.content[:200]}")
+        signup_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for name in names:
+            response = client.post(reverse("login"), {"username": name, "password": PASSWORD})
+            if response.status_code != 200:
+                raise CommandError(f"Login failed: {response.status_code} {response.content[:200]}")
+        login_elapsed = time.perf_counter() - started
+
+        # What signup used to do: create_user hashes, then set_password hashes again
+        started = time.perf_counter()
+        for name in names:
+            serializer = UserSerializer(data={"username": f"old-{name}", "password": PASSWORD,
+                                              "first_name": "Bench", "last_name": "User"})
+            serializer.is_valid(raise_exception=True)
+            user = serializer.save()
+            user.set_password(PASSWORD)
+            user.save()
+        previous_elapsed = time.perf_counter() - started
+
+        return {
+            "signups_per_second": rate(users, signup_elapsed),
+            "logins_per_second": rate(users, login_elapsed),
+            "previous_signup_path_per_second": rate(users, previous_elapsed),
+            "signup_ms": round(signup_elapsed / users * 1000, 2),
+            "login_ms": round(login_elapsed / users * 1000, 2),
+        }
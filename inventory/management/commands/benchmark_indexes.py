@@ -0,0 +1,98 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from inventory.models import DailyProductSales, Product, Sale
+from inventory.seed import seed
+
+# Indexes added for the hot paths; dropped to get the "before" numbers
+HOT_INDEXES = [
+    "product_date_id_idx",
+    "product_name_idx",
+    "sale_date_id_idx",
+    "sale_date_product_idx",
+    "sale_product_date_idx",
+    "daily_sales_day_product_idx",
+]
+
+
+def hot_queries():
+    product = Product.objects.order_by("pk").first()
+    today = timezone.localdate()
+    week_ago = timezone.now() - timedelta(days=7)
+    return {
+        "product list page": Product.objects.order_by("-date", "-id")[:50],
+        "product by name": Product.objects.filter(product_name=product.product_name),
+        "sale list page": Sale.objects.order_by("-date", "-id")[:50],
+        "sales of one product": Sale.objects.filter(product_id=product.pk).order_by("-date")[:50],
+        "week of sales by product": Sale.objects.filter(date__gte=week_ago)
+            .order_by().values("product").annotate(quantity=Sum("quantity_sold"), revenue=Sum("total_sale")),
+        "week of rollup by product": DailyProductSales.objects.filter(day__gte=today - timedelta(days=7))
+            .order_by().values("product").annotate(quantity=Sum("quantity"), revenue=Sum("revenue")),
+    }
+
+
+def measure(queryset, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"plan": queryset.explain(), "median_ms": round(statistics.median(timings), 3)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a dataset inside a transaction, then compare query plans and timings "
+        "for the hot queries with and without the inventory indexes. "
+        "Everything is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20000)
+        parser.add_argument("--sales", type=int, default=2000000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        report = {}
+        with transaction.atomic():
+            seed(
+                products=options["products"],
+                sales=options["sales"],
+                rebuild=False,
+                stdout=None if options["json"] else self.stdout,
+            )
+            DailyProductSales.objects.rebuild()
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            for name, queryset in hot_queries().items():
+                report[name] = {"after": measure(queryset, options["repeat"])}
+
+            with connection.cursor() as cursor:
+                for index in HOT_INDEXES:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(index)}")
+                cursor.execute("ANALYZE")
+
+            for name, queryset in hot_queries().items():
+                report[name]["before"] = measure(queryset, options["repeat"])
+
+            transaction.set_rollback(True)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for name, result in report.items():
+            before, after = result["before"], result["after"]
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{name}: {before['median_ms']} ms -> {after['median_ms']} ms"
+            ))
+            self.stdout.write(f"  before:\n    {before['plan'].replace(chr(10), chr(10) + '    ')}")
+            self.stdout.write(f"  after:\n    {after['plan'].replace(chr(10), chr(10) + '    ')}")
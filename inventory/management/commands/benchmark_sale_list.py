@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.models import Sale
+from inventory.seed import seed
+from inventory.serializers import SALE_LIST_FIELDS, SaleReadSerializer, SaleSerializer
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare listing sales through SaleSerializer on model instances with "
+        "SaleReadSerializer on .values() rows. Seeds inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sales", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        with transaction.atomic():
+            seed(products=200, sales=options["sales"], rebuild=False)
+
+            instances = list(Sale.objects.select_related("product", "category"))
+            rows = list(Sale.objects.values(*SALE_LIST_FIELDS))
+            results = {
+                "ModelSerializer without select_related (previous path)": best_of(
+                    repeat, lambda: SaleSerializer(Sale.objects.all(), many=True).data),
+                "ModelSerializer, serialize only": best_of(
+                    repeat, lambda: SaleSerializer(instances, many=True).data),
+                "SaleReadSerializer, serialize only": best_of(
+                    repeat, lambda: SaleReadSerializer(rows, many=True).data),
+                "ModelSerializer, fetch + serialize": best_of(
+                    repeat, lambda: SaleSerializer(Sale.objects.select_related("product", "category"), many=True).data),
+                "SaleReadSerializer, fetch + serialize": best_of(
+                    repeat, lambda: SaleReadSerializer(Sale.objects.values(*SALE_LIST_FIELDS), many=True).data),
+            }
+            transaction.set_rollback(True)
+
+        for name, elapsed in results.items():
+            self.stdout.write(f"{name}: {elapsed:.1f} ms")
+        model, lean = results["ModelSerializer, serialize only"], results["SaleReadSerializer, serialize only"]
+        previous = results["ModelSerializer without select_related (previous path)"]
+        fetched = results["SaleReadSerializer, fetch + serialize"]
+        self.stdout.write(self.style.SUCCESS(f"Serialization speedup: {model / lean:.1f}x"))
+        self.stdout.write(self.style.SUCCESS(f"Speedup over the previous list path: {previous / fetched:.1f}x"))
@@ -0,0 +1,111 @@
+import json
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import OperationalError, connection
+
+from inventory import tasks
+from inventory.loadtest import summarize
+from inventory.models import Category, Product, Task
+from inventory.serializers import SaleSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure sustained sale-write throughput with many concurrent writer threads "
+        "against the configured database. Rows it creates are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=16)
+        parser.add_argument("--sales-per-writer", type=int, default=200)
+        parser.add_argument("--products", type=int, default=8,
+                            help="Products the writers spread over; fewer means more row contention")
+        parser.add_argument("--defer", default=None,
+                            help="Comma-separated sale effects to defer to the task queue "
+                                 "(rollup,cache); the queue is drained after the run and timed")
+
+    def handle(self, *args, **options):
+        writers = options["writers"]
+        per_writer = options["sales_per_writer"]
+        configured_tasks = getattr(settings, "INVENTORY_TASKS", {})
+        task_options = dict(configured_tasks)
+        if options["defer"] is not None:
+            task_options["DEFERRED_SALE_EFFECTS"] = [effect for effect in options["defer"].split(",") if effect]
+        catalog = []
+        try:
+            # read by the sale signals in every writer thread for the duration of the run
+            settings.INVENTORY_TASKS = task_options
+            for i in range(options["products"]):
+                product = Product.objects.create(
+                    product_name=f"bench-writer-{i}", stock_quantity=writers * per_writer, price=Decimal("1.00")
+                )
+                catalog.append((product.pk, Category.objects.create(product=product, name="bench").pk))
+            report = self.run(catalog, writers, per_writer)
+        finally:
+            settings.INVENTORY_TASKS = configured_tasks
+            product_ids = [product_id for product_id, _ in catalog]
+            # cascades to the sales, rollups and ledger rows of the run; an
+            # interrupted run can also leave queued effects behind
+            Product.objects.filter(pk__in=product_ids).delete()
+            Task.objects.filter(payload__product_id__in=product_ids).delete()
+
+        report["deferred_sale_effects"] = task_options.get("DEFERRED_SALE_EFFECTS", [])
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                report["journal_mode"] = cursor.fetchone()[0]
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, catalog, writers, per_writer):
+        latencies = []
+        failures = {"locked": 0, "other": 0}
+        lock = threading.Lock()
+
+        def writer(index):
+            try:
+                for n in range(per_writer):
+                    product_id, category_id = catalog[(index + n) % len(catalog)]
+                    started = time.perf_counter()
+                    try:
+                        serializer = SaleSerializer(data={
+                            "product": product_id,
+                            "category": category_id,
+                            "quantity_sold": 1,
+                            "unit_price": "1.00",
+                        })
+                        serializer.is_valid(raise_exception=True)
+                        serializer.save()
+                    except OperationalError as exc:
+                        with lock:
+                            failures["locked" if "locked" in str(exc) else "other"] += 1
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        drain_started = time.perf_counter()
+        drained = tasks.run_pending()
+        drain_elapsed = time.perf_counter() - drain_started
+
+        report = summarize(latencies, sum(failures.values()), elapsed)
+        report.update({
+            "vendor": connection.vendor,
+            "writers": writers,
+            "database_locked_errors": failures["locked"],
+            "tasks_drained": drained,
+            "drain_seconds": round(drain_elapsed, 3),
+        })
+        return report
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from inventory.models import Alert, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Evaluate low-stock alerts for every product with a reorder threshold or an open alert. "
+        "Only needed after bulk changes that bypass the incremental evaluation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        product_ids = (
+            Product.objects.filter(reorder_threshold__isnull=False).values_list("pk", flat=True)
+            .union(Alert.objects.open().values_list("product_id", flat=True))
+        )
+        batch, evaluated = [], 0
+        for product_id in product_ids.iterator():
+            batch.append(product_id)
+            if len(batch) >= options["batch_size"]:
+                Alert.objects.evaluate(batch)
+                evaluated += len(batch)
+                batch = []
+        Alert.objects.evaluate(batch)
+        evaluated += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f"Evaluated {evaluated} products; {Alert.objects.open().count()} alerts open"
+        ))
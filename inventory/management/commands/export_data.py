@@ -0,0 +1,49 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.export import CONTENT_TYPES, EXPORTS, export_chunks, gzip_chunks, parse_filters
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream sales or products to CSV or NDJSON in constant memory. "
+        "Writes to stdout unless --output is given; gzips when it ends in .gz or with --gzip."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(EXPORTS))
+        parser.add_argument("--format", choices=list(CONTENT_TYPES), default="csv")
+        parser.add_argument("--product", help="Only this product id")
+        parser.add_argument("--start", help="YYYY-MM-DD, inclusive")
+        parser.add_argument("--end", help="YYYY-MM-DD, inclusive")
+        parser.add_argument("--output", help="File to write (default: stdout)")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--chunk-size", type=int, help="Rows fetched and encoded at a time")
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_filters(options)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        chunks = export_chunks(options["kind"], options["format"], options["chunk_size"], **filters)
+        path = options["output"]
+        if options["gzip"] or (path and path.endswith(".gz")):
+            chunks = gzip_chunks(chunks)
+
+        started = time.perf_counter()
+        written = 0
+        handle = open(path, "wb") if path else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                handle.write(chunk)
+                written += len(chunk)
+        finally:
+            if path:
+                handle.close()
+            else:
+                handle.flush()
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stderr.write(f"Wrote {written} bytes in {elapsed:.2f}s ({written / elapsed / 2**20:.1f} MiB/s)")
@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.catalog import FORMATS, import_products
+
+EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".json": "json"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update products, matched on sku, from a CSV, NDJSON or JSON array file "
+        "('-' reads stdin). Prints a JSON report with per-row errors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, help="Rows validated and written per transaction")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if file_format is None:
+            raise CommandError("Pass --format; it cannot be told from the file name")
+
+        started = time.perf_counter()
+        if path == "-":
+            report = import_products(sys.stdin.buffer, file_format, options["batch_size"])
+        else:
+            with open(path, "rb") as stream:
+                report = import_products(stream, file_format, options["batch_size"])
+        elapsed = time.perf_counter() - started
+
+        rows = report["created"] + report["updated"] + report["failed"]
+        report["seconds"] = round(elapsed, 2)
+        report["rows_per_minute"] = round(rows / elapsed * 60) if elapsed else None
+        self.stdout.write(json.dumps(report, indent=2))
+        if "error" in report:
+            raise CommandError(report["error"])
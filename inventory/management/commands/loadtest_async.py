@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand
+
+from inventory.loadtest import run_load
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the sync read endpoints against their async twins on a running server, "
+        "e.g. gunicorn config.wsgi vs uvicorn config.asgi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000/api/",
+                            help="API root of the server serving the sync views")
+        parser.add_argument("--async-base-url",
+                            help="API root of the server serving the async views (defaults to --base-url)")
+        parser.add_argument("--token", required=True, help="Bearer token of a staff user")
+        parser.add_argument("--product-id", type=int, default=1)
+        parser.add_argument("--search", default="a")
+        parser.add_argument("--clients", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=10, help="Requests per client")
+        parser.add_argument("--read-delay", type=float, default=0.0,
+                            help="Seconds to pause between response chunks, simulating slow clients")
+
+    def handle(self, *args, **options):
+        sync_base = options["base_url"]
+        async_base = options["async_base_url"] or sync_base
+        routes = [
+            ("list", "", "async/"),
+            ("detail", f"{options['product_id']}/", f"async/{options['product_id']}/"),
+            ("search", f"search-product/?searched={options['search']}",
+             f"async/search-product/?searched={options['search']}"),
+            ("analytics", "sales/", "async/sales/"),
+        ]
+        headers = {"Authorization": f"Bearer {options['token']}"}
+
+        report = {}
+        for name, sync_path, async_path in routes:
+            report[name] = {}
+            for mode, url in (("wsgi", sync_base + sync_path), ("asgi", async_base + async_path)):
+                report[name][mode] = asyncio.run(run_load(
+                    url, options["clients"], options["requests"],
+                    headers=headers, read_delay=options["read_delay"],
+                ))
+        self.stdout.write(json.dumps(report, indent=2))
+
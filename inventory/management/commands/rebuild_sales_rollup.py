@@ -0,0 +1,22 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from inventory.models import DailyProductSales
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyProductSales rollup from the Sale table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--end", help="Last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"]) if options["start"] else None
+            end = date.fromisoformat(options["end"]) if options["end"] else None
+        except ValueError as exc:
+            raise CommandError(f"Invalid date: {exc}")
+
+        written = DailyProductSales.objects.rebuild(start=start, end=end)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily rollup rows"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from inventory import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from the Product table"
+
+    def handle(self, *args, **options):
+        connection = search.get_connection()
+        if search.backend_for(connection) is None and not search.create_index(connection):
+            self.stdout.write(self.style.WARNING("This database has no full-text search support"))
+            return
+        with transaction.atomic(using=connection.alias):
+            count = search.rebuild_index(connection)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products"))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from inventory import images
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = "Render thumbnails for product images that have none (or for all of them with --all)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Re-render thumbnails that already exist")
+
+    def handle(self, *args, **options):
+        pending = set()
+        rows = Product.objects.exclude(image="").exclude(image__isnull=True).values_list("image", "image_variants")
+        for name, variants in rows.iterator():
+            if options["all"] or variants.get("source") != name:
+                pending.add(name)
+        if options["all"]:
+            Product.objects.filter(image__in=pending).update(image_variants={})
+        failed = 0
+        for name in sorted(pending):
+            try:
+                images.generate_thumbnails(name)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"{name}: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Rendered thumbnails for {len(pending) - failed} images"))
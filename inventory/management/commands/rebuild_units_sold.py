@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild Product.units_sold from the Sale table"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = Product.objects.rebuild_units_sold()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt units_sold for {updated} products"))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventory import tasks
+
+
+class Command(BaseCommand):
+    help = "Work through the inventory task queue, polling for new tasks until interrupted"
+
+    def add_arguments(self, parser):
+        options = tasks.get_options()
+        parser.add_argument("--batch-size", type=int, default=options.get("BATCH_SIZE", 100))
+        parser.add_argument("--poll-interval", type=float, default=options.get("POLL_INTERVAL", 1.0),
+                            help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        worker = tasks.worker_id()
+        self.stdout.write(f"Worker {worker} started")
+        processed = 0
+        try:
+            while True:
+                close_old_connections()
+                count = tasks.run_pending(options["batch_size"], worker)
+                processed += count
+                if count:
+                    self.stdout.write(f"Processed {count} tasks")
+                elif options["burst"]:
+                    break
+                else:
+                    time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker} stopped after {processed} tasks"))
@@ -0,0 +1,289 @@
+"""
+Per-request performance instrumentation.
+
+MetricsMiddleware times each sampled request and attributes database
+queries (through an execute wrapper installed on every connection) and
+the to_representation() time of serializers using TimedSerializerMixin
+to it. Observations go into in-process histograms keyed
+by the route names in inventory/urls.py, exposed in the Prometheus text
+format by metrics_view along with the token cache's hit counts, and
+summarized per response in a Server-Timing header. With SAMPLE_RATE
+set to 0 the middleware removes itself and no wrapper is installed.
+"""
+import contextvars
+import functools
+import hmac
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .authentication import token_cache
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def get_options():
+    return getattr(settings, "INVENTORY_METRICS", {})
+
+
+def sample_rate():
+    return float(get_options().get("SAMPLE_RATE", 0))
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # one count per bucket, then +Inf, sum
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = [(labels, list(series)) for labels, series in self.series.items()]
+        for labels, series in sorted(items):
+            label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+            prefix = f"{label_text}," if label_text else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[len(self.buckets)]}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {series[len(self.buckets)]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.series.items())
+        for labels, value in items:
+            label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+            lines.append(f"{self.name}{{{label_text}}} {value}")
+        return lines
+
+
+REQUESTS = Counter("inventory_requests_total", "Sampled requests by route, method and status.")
+DURATION = Histogram("inventory_request_duration_seconds", "Wall time per request.", SECONDS_BUCKETS)
+DB_QUERIES = Histogram("inventory_request_db_queries", "Database queries per request.", QUERY_BUCKETS)
+DB_DURATION = Histogram("inventory_request_db_duration_seconds", "Database time per request.", SECONDS_BUCKETS)
+SERIALIZER_DURATION = Histogram(
+    "inventory_request_serializer_duration_seconds", "Serializer time per request.", SECONDS_BUCKETS
+)
+RESPONSE_SIZE = Histogram("inventory_response_size_bytes", "Response body size.", BYTES_BUCKETS)
+REGISTRY = [REQUESTS, DURATION, DB_QUERIES, DB_DURATION, SERIALIZER_DURATION, RESPONSE_SIZE]
+
+
+class RequestMetrics:
+    __slots__ = ("queries", "db_time", "serializer_time", "serializer_depth")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+
+# Follows the request into sync_to_async threads, unlike a thread local
+current = contextvars.ContextVar("inventory_request_metrics", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed_representation(method):
+    """Add a to_representation() call's time to the request's serializer time"""
+    @functools.wraps(method)
+    def to_representation(self, instance):
+        metrics = current.get()
+        if metrics is None:
+            return method(self, instance)
+        metrics.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return method(self, instance)
+        finally:
+            metrics.serializer_depth -= 1
+            # nested serializers are part of the outermost one's time
+            if not metrics.serializer_depth:
+                metrics.serializer_time += time.perf_counter() - started
+    return to_representation
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin timing to_representation(), including an override
+    defined by the serializer itself. many=True is covered through the
+    child's calls, streamed listings too.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        own = cls.__dict__.get("to_representation")
+        if own is not None:
+            cls.to_representation = timed_representation(own)
+
+    @timed_representation
+    def to_representation(self, instance):
+        return super().to_representation(instance)
+
+
+_installed = False
+
+
+def install():
+    """Hook DB timing in; called once when sampling is on"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(install_query_recorder, dispatch_uid="inventory_metrics")
+    from django.db import connections
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(None, connection)
+
+
+def route_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or "unnamed"
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.rate = sample_rate()
+        if self.rate <= 0:
+            raise MiddlewareNotUsed
+        self.server_timing = get_options().get("SERVER_TIMING", True)
+        self.get_response = get_response
+        install()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.rate < 1 and random.random() >= self.rate:
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if self.rate < 1 and random.random() >= self.rate:
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - started)
+
+    def finish(self, request, response, metrics, elapsed):
+        route = route_name(request)
+        labels = (("route", route),)
+        REQUESTS.inc((("route", route), ("method", request.method), ("status", str(response.status_code))))
+        DURATION.observe(labels, elapsed)
+        DB_QUERIES.observe(labels, metrics.queries)
+        DB_DURATION.observe(labels, metrics.db_time)
+        SERIALIZER_DURATION.observe(labels, metrics.serializer_time)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(labels, len(response.content))
+        if self.server_timing:
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries"',
+                f"serializer;dur={metrics.serializer_time * 1000:.2f}",
+                f"total;dur={elapsed * 1000:.2f}",
+            ])
+        return response
+
+
+def token_cache_lines():
+    info = token_cache.info()
+    lines = []
+    for name, kind, documentation, value in (
+        ("inventory_token_cache_hits_total", "counter", "Token resolutions served from the token cache.", info["hits"]),
+        ("inventory_token_cache_misses_total", "counter", "Token resolutions that went to the database.", info["misses"]),
+        ("inventory_token_cache_size", "gauge", "Tokens held in this process's token cache.", info["size"]),
+    ):
+        lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {value}"])
+    return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    lines.extend(token_cache_lines())
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of the in-process metrics, for the
+    AUTH_TOKEN bearer token if one is set and otherwise staff sessions
+    """
+    token = get_options().get("AUTH_TOKEN")
+    if token:
+        allowed = hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:45
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_units_sold(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    Sale = apps.get_model('inventory', 'Sale')
+    totals = (
+        Sale.objects.filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('quantity_sold'))
+        .values('total')
+    )
+    Product.objects.update(units_sold=Coalesce(Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_alter_product_stock_quantity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='units_sold',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Units sold across all sales'),
+        ),
+        migrations.RunPython(backfill_units_sold, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_product_units_sold'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['date', 'id'], name='product_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['date', 'id'], name='sale_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# The index as it stood when this migration was written; later changes to
+# inventory.search must come with their own migration rather than edit this.
+FTS_TABLE = 'inventory_product_fts'
+PG_TABLE = 'inventory_product_search'
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    "product_name, description, "
+                    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+                )
+            except Exception:
+                # SQLite compiled without FTS5; search falls back to icontains
+                return
+            insert = f"INSERT INTO {FTS_TABLE} (rowid, product_name, description) VALUES (%s, %s, %s)"
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {PG_TABLE} ("
+                "product_id bigint PRIMARY KEY "
+                "REFERENCES inventory_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {PG_TABLE}_document_idx ON {PG_TABLE} USING GIN (document)"
+            )
+            insert = (
+                f"INSERT INTO {PG_TABLE} (product_id, document) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')) "
+                "ON CONFLICT (product_id) DO NOTHING"
+            )
+        else:
+            return
+
+        Product = apps.get_model('inventory', 'Product')
+        rows = Product.objects.using(connection.alias).values_list('id', 'product_name', 'description')
+        batch = []
+        for pk, name, description in rows.iterator(chunk_size=2000):
+            batch.append((pk, name or '', description or ''))
+            if len(batch) >= 2000:
+                cursor.executemany(insert, batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert, batch)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f"DROP TABLE IF EXISTS {PG_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
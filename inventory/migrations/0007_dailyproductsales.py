@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('unit_price_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sale_count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='inventory.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily product sales',
+                'indexes': [models.Index(fields=['day', 'product'], name='daily_sales_day_product_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('product', 'day'), name='daily_sales_product_day_uniq'),
+        ),
+    ]
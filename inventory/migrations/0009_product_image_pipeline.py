@@ -0,0 +1,24 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:15
+
+import inventory.images
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Thumbnail paths by size, filled in by the thumbnail worker'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=inventory.images.ContentAddressedStorage(), upload_to='products'),
+        ),
+    ]
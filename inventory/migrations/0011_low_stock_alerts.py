@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_task_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reorder_threshold',
+            field=models.PositiveIntegerField(blank=True, help_text='Open a low-stock alert when stock falls to this level', null=True),
+        ),
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('resolved', 'Resolved')], default='open', max_length=10)),
+                ('threshold', models.PositiveIntegerField(help_text='Reorder threshold when the alert opened')),
+                ('stock_quantity', models.PositiveIntegerField(help_text='Stock when the alert opened')),
+                ('opened_at', models.DateTimeField(auto_now_add=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', '-opened_at', '-id'], name='alert_status_opened_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='alert',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'open')), fields=('product',), name='alert_one_open_per_product'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_low_stock_alerts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, help_text='Stock keeping unit; catalog imports match products on it', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def open_balances(apps, schema_editor):
+    """Start the ledger from each existing product's current stock"""
+    Product = apps.get_model('inventory', 'Product')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    now = timezone.now()
+    batch = []
+    for product_id, stock in Product.objects.values_list('pk', 'stock_quantity').iterator():
+        batch.append(StockMovement(
+            product_id=product_id, kind='adjustment', quantity=stock, note='Opening balance', created_at=now,
+        ))
+        if len(batch) >= 5000:
+            StockMovement.objects.bulk_create(batch)
+            batch = []
+    StockMovement.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_product_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('stock_quantity', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventory.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'Sale'), ('restock', 'Restock'), ('adjustment', 'Adjustment'), ('return', 'Return')], max_length=10)),
+                ('quantity', models.IntegerField(help_text='Change in stock; negative for units leaving')),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventory.product')),
+                ('sale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='inventory.sale')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='movement_product_created_idx'), models.Index(fields=['created_at'], name='movement_created_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('product', 'taken_at'), name='snapshot_product_taken_at'),
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+# The index as declared on Sale, and the covering variant built where the
+# backend supports INCLUDE (PostgreSQL). Migration state keeps the plain
+# declaration so the model needs no INCLUDE that SQLite would warn about.
+PLAIN = models.Index(fields=['date', 'product'], name='sale_date_product_idx')
+COVERING = models.Index(
+    fields=['date', 'product'], include=['quantity_sold', 'total_sale', 'unit_price'],
+    name='sale_date_product_idx',
+)
+
+
+def replace_index(old, new):
+    def run(apps, schema_editor):
+        if not schema_editor.connection.features.supports_covering_indexes:
+            return
+        Sale = apps.get_model('inventory', 'Sale')
+        schema_editor.remove_index(Sale, old)
+        schema_editor.add_index(Sale, new)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(replace_index(PLAIN, COVERING), replace_index(COVERING, PLAIN)),
+    ]
@@ -1,39 +1,134 @@
-from django.db import models
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.contrib.auth.password_validation import validate_password
+from .cache import invalidate_product
+from .images import product_image_storage
 # Create your models here.
 
+
+class ProductQuerySet(models.QuerySet):
+    def units_sold_subquery(self):
+        """
+        Correlated subquery summing quantity_sold for the outer product.
+        Evaluated by the database, so no Sale rows reach Python.
+        """
+        totals = (
+            Sale.objects.filter(product=OuterRef('pk'))
+            .order_by()
+            .values('product')
+            .annotate(total=Sum('quantity_sold'))
+            .values('total')
+        )
+        return Coalesce(Subquery(totals), 0)
+
+    def rebuild_units_sold(self):
+        """Recompute the units_sold column from the Sale table"""
+        return self.update(units_sold=self.units_sold_subquery())
+
+
 class Product(models.Model):
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True,
+                           help_text="Stock keeping unit; catalog imports match products on it")
     product_name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     stock_quantity = models.PositiveIntegerField(validators=[MinValueValidator(0)],help_text="Current stock quantity",blank=True)
     price = models.DecimalField(max_digits=10,decimal_places=2,validators=[MinValueValidator(0)])
     date = models.DateTimeField(auto_now_add=True)
-    image = models.ImageField(blank=True,null=True)
+    image = models.ImageField(upload_to='products', storage=product_image_storage, blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False,
+                                      help_text="Thumbnail paths by size, filled in by the thumbnail worker")
+    units_sold = models.PositiveIntegerField(default=0, editable=False, help_text="Units sold across all sales")
+    reorder_threshold = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Open a low-stock alert when stock falls to this level"
+    )
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination order for product listings
+            models.Index(fields=['date', 'id'], name='product_date_id_idx'),
+            # Exact name lookups
+            models.Index(fields=['product_name'], name='product_name_idx'),
+        ]
 
     def __str__(self):
         return self.product_name
     
-    def update_quantity(self, quantity_change):
+    def update_quantity(self, quantity_change, kind=None, note=''):
         """
         Method to update product quantity
-        Can be used for sales, restocking, etc.
+        Can be used for restocking, returns, adjustments, etc.
+        The change is applied in the database, so concurrent callers
+        cannot overwrite each other's updates, and recorded in the
+        stock ledger as a `kind` movement (adjustment by default).
+        """
+        with transaction.atomic():
+            Product.objects.filter(pk=self.pk).update(
+                stock_quantity=F('stock_quantity') + quantity_change
+            )
+            StockMovement.objects.create(
+                product_id=self.pk, kind=kind or StockMovement.ADJUSTMENT, quantity=quantity_change, note=note,
+            )
+        self.refresh_from_db(fields=['stock_quantity'])
+        invalidate_product(self.pk)
+        Alert.objects.evaluate([self.pk])
+
+    def decrement_stock(self, quantity):
         """
-        self.stock_quantity += quantity_change
-        self.save()
+        Atomically take `quantity` units out of stock with a single
+        conditional UPDATE. Returns False and changes nothing if fewer
+        than `quantity` units are left.
+        """
+        updated = Product.objects.filter(
+            pk=self.pk, stock_quantity__gte=quantity
+        ).update(stock_quantity=F('stock_quantity') - quantity)
+        if updated:
+            self.refresh_from_db(fields=['stock_quantity'])
+        return bool(updated)
         
         
-    def quantity_left(self,ramaining_quantity):
+    def quantity_left(self, as_of=None):
+        """
+        Method to calculate product quantity left, now or at the
+        datetime `as_of` (None if the ledger has no record that far back)
         """
-        Method to calculate product quantity left
-        """    
-        self.remaining_quantity = self.stock_quantity - Sale.product_quantity
-        self.save>()
+        if as_of is None:
+            return self.stock_quantity
+        return StockMovement.objects.stock_at(self.pk, as_of)
+
+    @property
+    def remaining_stock(self):
+        # sales take their units off stock_quantity as they are recorded
+        return self.stock_quantity
     
+class CategoryQuerySet(models.QuerySet):
+    def with_sales_count(self):
+        """Annotate `sales_count` with a correlated count, evaluated per returned row"""
+        counts = (
+            Sale.objects.filter(category=OuterRef('pk'))
+            .order_by()
+            .values('category')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        return self.annotate(sales_count=Coalesce(Subquery(counts), 0))
+
+
 class Category(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)    
 
+    objects = CategoryQuerySet.as_manager()
+
     def __str__(self):
         return self.name
     
@@ -49,10 +144,378 @@ class Sale(models.Model):
     unit_price = models.DecimalField(max_digits=10,decimal_places=2, validators=[MinValueValidator(0)])
     total_sale = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order for sale listings
+            models.Index(fields=['date', 'id'], name='sale_date_id_idx'),
+            # Date range scans grouped by product (analytics, rollup rebuilds).
+            # Migration 0014 makes it covering for the summed columns on
+            # backends that support INCLUDE (PostgreSQL).
+            models.Index(fields=['date', 'product'], name='sale_date_product_idx'),
+            # A product's sales in date order
+            models.Index(fields=['product', 'date'], name='sale_product_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.product_name} - {self.quantity_sold} units"
     
+    def clean(self):
+        """Editing a sale takes any extra units from stock; refuse edits the stock can't cover"""
+        if self._state.adding or self.product_id is None or self.quantity_sold is None:
+            return
+        saved = Sale.objects.filter(pk=self.pk).values_list('product_id', 'quantity_sold').first()
+        extra = self.quantity_sold - (saved[1] if saved and saved[0] == self.product_id else 0)
+        stock = Product.objects.filter(pk=self.product_id).values_list('stock_quantity', flat=True).first()
+        if extra > 0 and (stock or 0) < extra:
+            raise ValidationError({'quantity_sold': f'Not enough stock to sell {extra} more units'})
+
     def save(self, *args, **kwargs):
         self.total_sale = self.quantity_sold * self.unit_price
-        super().save(*args, **kwargs)
\ No newline at end of file
+        # edits move stock in post_save receivers, which can refuse them
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class DailyProductSalesQuerySet(models.QuerySet):
+    def apply(self, product_id, day, quantity, revenue, unit_price_total, sale_count):
+        """
+        Add (or with negative values, subtract) sales to one rollup row.
+        Increments are applied with F() so concurrent writers don't collide.
+        """
+        changes = dict(
+            quantity=F('quantity') + quantity,
+            revenue=F('revenue') + revenue,
+            unit_price_total=F('unit_price_total') + unit_price_total,
+            sale_count=F('sale_count') + sale_count,
+        )
+        if self.filter(product_id=product_id, day=day).update(**changes):
+            return
+        if sale_count <= 0:
+            return
+        try:
+            with transaction.atomic():
+                self.create(
+                    product_id=product_id,
+                    day=day,
+                    quantity=quantity,
+                    revenue=revenue,
+                    unit_price_total=unit_price_total,
+                    sale_count=sale_count,
+                )
+        except IntegrityError:
+            # Another writer created the row first
+            self.filter(product_id=product_id, day=day).update(**changes)
+
+    def apply_sales(self, sales, sign=1):
+        """Roll a batch of sales into the table, one update per (product, day)"""
+        self.apply_deltas(rollup_delta(sale, sign) for sale in sales)
+
+    def apply_deltas(self, deltas):
+        """Apply rollup_delta() dicts, summed per (product, day) first"""
+        totals = {}
+        for delta in deltas:
+            key = (delta['product_id'], delta['day'])
+            row = totals.setdefault(key, [0, Decimal('0'), Decimal('0'), 0])
+            row[0] += delta['quantity']
+            row[1] += Decimal(delta['revenue'])
+            row[2] += Decimal(delta['unit_price_total'])
+            row[3] += delta['sale_count']
+        for (product_id, day), (quantity, revenue, unit_price_total, sale_count) in totals.items():
+            self.apply(product_id, date.fromisoformat(day), quantity, revenue, unit_price_total, sale_count)
+
+    def rebuild(self, start=None, end=None, batch_size=2000):
+        """
+        Recompute rollup rows from the Sale table, optionally limited to
+        the days start..end inclusive. Returns the number of rows written.
+        """
+        sales = Sale.objects.all()
+        rollups = self.all()
+        if start:
+            sales = sales.filter(date__gte=day_start(start))
+            rollups = rollups.filter(day__gte=start)
+        if end:
+            sales = sales.filter(date__lt=day_start(end + timedelta(days=1)))
+            rollups = rollups.filter(day__lte=end)
+
+        rows = (
+            sales.annotate(day=TruncDate('date'))
+            .order_by()
+            .values('product_id', 'day')
+            .annotate(
+                total_quantity=Sum('quantity_sold'),
+                total_revenue=Sum('total_sale'),
+                total_unit_price=Sum('unit_price'),
+                total_count=Count('id'),
+            )
+        )
+        written = 0
+        with transaction.atomic():
+            rollups.delete()
+            batch = []
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(self.model(
+                    product_id=row['product_id'],
+                    day=row['day'],
+                    quantity=row['total_quantity'],
+                    revenue=row['total_revenue'],
+                    unit_price_total=row['total_unit_price'],
+                    sale_count=row['total_count'],
+                ))
+                if len(batch) >= batch_size:
+                    written += len(self.bulk_create(batch))
+                    batch = []
+            written += len(self.bulk_create(batch))
+        return written
+
+
+def rollup_delta(sale, sign=1):
+    """A sale's contribution to its rollup row, as JSON-safe values for the task queue"""
+    return {
+        'product_id': sale.product_id,
+        'day': timezone.localdate(sale.date).isoformat(),
+        'quantity': sign * sale.quantity_sold,
+        'revenue': str(sign * sale.total_sale),
+        'unit_price_total': str(sign * sale.unit_price),
+        'sale_count': sign,
+    }
+
+
+def day_start(day):
+    """Aware datetime for midnight at the start of `day` in the current timezone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class DailyProductSales(models.Model):
+    """
+    Per product, per day sales totals maintained as sales are created
+    and deleted, so analytics never has to scan the Sale table.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+    quantity = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    unit_price_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sale_count = models.PositiveIntegerField(default=0)
+
+    objects = DailyProductSalesQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "Daily product sales"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='daily_sales_product_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'product'], name='daily_sales_day_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.day}: {self.quantity} units"
+
+
+class Task(models.Model):
+    """Deferred work for `manage.py run_tasks`; see inventory.tasks"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The worker's claim query: due tasks in order
+            models.Index(fields=['status', 'run_after'], name='task_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+def resolve_level(threshold):
+    """
+    Stock at which an open alert resolves: the threshold plus a margin
+    (INVENTORY_ALERTS['HYSTERESIS_PERCENT'], at least one unit), so stock
+    hovering around the threshold does not open and close alerts repeatedly.
+    """
+    percent = getattr(settings, 'INVENTORY_ALERTS', {}).get('HYSTERESIS_PERCENT', 20)
+    return threshold + max(1, -(-threshold * percent // 100))
+
+
+class AlertQuerySet(models.QuerySet):
+    def open(self):
+        return self.filter(status=Alert.OPEN)
+
+    def evaluate(self, product_ids):
+        """
+        Open or resolve low-stock alerts for just these products. Costs two
+        reads and at most two writes however large the catalog is.
+        """
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+        products = Product.objects.filter(pk__in=product_ids).values_list(
+            'pk', 'stock_quantity', 'reorder_threshold'
+        )
+        already_open = set(self.open().filter(product_id__in=product_ids).values_list('product_id', flat=True))
+        to_open, to_resolve = [], []
+        for product_id, stock, threshold in products:
+            if product_id in already_open:
+                if threshold is None or stock >= resolve_level(threshold):
+                    to_resolve.append(product_id)
+            elif threshold is not None and stock <= threshold:
+                to_open.append(Alert(product_id=product_id, threshold=threshold, stock_quantity=stock))
+        if to_open:
+            # a concurrent evaluation may have opened one first; the partial
+            # unique constraint keeps it to one open alert per product
+            self.bulk_create(to_open, ignore_conflicts=True)
+        if to_resolve:
+            self.open().filter(product_id__in=to_resolve).update(status=Alert.RESOLVED, resolved_at=timezone.now())
+
+
+class Alert(models.Model):
+    """A product's stock reaching its reorder threshold; open until restocked"""
+    OPEN = 'open'
+    RESOLVED = 'resolved'
+    STATUS_CHOICES = [(OPEN, 'Open'), (RESOLVED, 'Resolved')]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='alerts')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN)
+    threshold = models.PositiveIntegerField(help_text="Reorder threshold when the alert opened")
+    stock_quantity = models.PositiveIntegerField(help_text="Stock when the alert opened")
+    opened_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    objects = AlertQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product'], condition=models.Q(status='open'), name='alert_one_open_per_product',
+            ),
+        ]
+        indexes = [
+            # Alert listing, newest first within a status
+            models.Index(fields=['status', '-opened_at', '-id'], name='alert_status_opened_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.stock_quantity} <= {self.threshold} ({self.status})"
+
+
+class StockMovementQuerySet(models.QuerySet):
+    def stock_at(self, product_id, when):
+        """
+        A product's stock after every movement up to `when`: its latest
+        snapshot at or before `when` plus the movements since, so only a
+        short stretch of the ledger is read. None before its first movement.
+        """
+        snapshot = StockSnapshot.objects.filter(product_id=product_id, taken_at__lte=when).order_by(
+            '-taken_at'
+        ).values_list('taken_at', 'stock_quantity').first()
+        movements = self.filter(product_id=product_id, created_at__lte=when)
+        if snapshot is not None:
+            movements = movements.filter(created_at__gt=snapshot[0])
+        totals = movements.aggregate(quantity=Sum('quantity'), count=Count('id'))
+        if snapshot is None and not totals['count']:
+            return None
+        return (snapshot[1] if snapshot else 0) + (totals['quantity'] or 0)
+
+
+class StockMovement(models.Model):
+    """
+    One change to a product's stock. The ledger is append-only: mistakes
+    are corrected with another movement, never by editing one.
+    """
+    SALE = 'sale'
+    RESTOCK = 'restock'
+    ADJUSTMENT = 'adjustment'
+    RETURN = 'return'
+    KIND_CHOICES = [(SALE, 'Sale'), (RESTOCK, 'Restock'), (ADJUSTMENT, 'Adjustment'), (RETURN, 'Return')]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    quantity = models.IntegerField(help_text="Change in stock; negative for units leaving")
+    sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = StockMovementQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # A product's movements since its last snapshot
+            models.Index(fields=['product', 'created_at'], name='movement_product_created_idx'),
+            # Snapshot runs sum everything since the previous run
+            models.Index(fields=['created_at'], name='movement_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity:+d} ({self.kind})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Stock movements cannot be changed; record a new adjustment instead")
+        super().save(*args, **kwargs)
+
+
+class StockSnapshotQuerySet(models.QuerySet):
+    def take(self, at=None, batch_size=500):
+        """
+        Snapshot the stock of every product with movements since the last
+        run, as of `at` (default: now minus SNAPSHOT_LAG_SECONDS, so
+        transactions still in flight are not missed). Returns the number
+        of snapshots written.
+        """
+        if at is None:
+            lag = getattr(settings, 'INVENTORY_STOCK_LEDGER', {}).get('SNAPSHOT_LAG_SECONDS', 60)
+            at = timezone.now() - timedelta(seconds=lag)
+        previous = self.aggregate(at=Max('taken_at'))['at']
+        if previous is not None and at <= previous:
+            return 0
+        movements = StockMovement.objects.filter(created_at__lte=at)
+        if previous is not None:
+            movements = movements.filter(created_at__gt=previous)
+        deltas = dict(
+            movements.order_by().values('product').annotate(total=Sum('quantity')).values_list('product', 'total')
+        )
+
+        product_ids = sorted(deltas)
+        latest = self.filter(product=OuterRef('pk')).order_by('-taken_at').values('stock_quantity')[:1]
+        written = 0
+        # all or nothing: the next run starts from this run's taken_at
+        with transaction.atomic():
+            for offset in range(0, len(product_ids), batch_size):
+                chunk = product_ids[offset:offset + batch_size]
+                last = Product.objects.filter(pk__in=chunk).annotate(last=Subquery(latest)).values_list('pk', 'last')
+                written += len(self.bulk_create(
+                    StockSnapshot(product_id=pk, taken_at=at, stock_quantity=(stock or 0) + deltas[pk])
+                    for pk, stock in last
+                ))
+        return written
+
+
+class StockSnapshot(models.Model):
+    """A product's stock at `taken_at`, so point-in-time reads skip older movements"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    taken_at = models.DateTimeField()
+    stock_quantity = models.IntegerField()
+
+    objects = StockSnapshotQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # also the index for a product's latest snapshot before a time
+            models.UniqueConstraint(fields=['product', 'taken_at'], name='snapshot_product_taken_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.stock_quantity} at {self.taken_at}"
@@ -0,0 +1,96 @@
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class InventoryCursorPagination(CursorPagination):
+    """
+    Keyset pagination: each page is a range scan on the ordering columns,
+    so the cost of a page does not depend on how deep into the table it is.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = ("-id",)
+
+
+class ProductCursorPagination(InventoryCursorPagination):
+    ordering = ("-date", "-id")
+
+
+class SaleCursorPagination(InventoryCursorPagination):
+    ordering = ("-date", "-id")
+
+
+class CategoryCursorPagination(InventoryCursorPagination):
+    ordering = ("-id",)
+
+
+class AlertCursorPagination(InventoryCursorPagination):
+    ordering = ("-opened_at", "-id")
+
+
+class SearchPagination(LimitOffsetPagination):
+    """
+    Ranked search results have no stable keyset to page on, but the
+    index answers LIMIT/OFFSET over its own ranking cheaply.
+    """
+    default_limit = 50
+    max_limit = 500
+
+
+STREAM_PARAM = "stream"
+STREAM_CHUNK_SIZE = 500
+
+
+def wants_stream(request):
+    """Streaming is opt-in with ?stream=1"""
+    return request.query_params.get(STREAM_PARAM, "").lower() in ("1", "true", "yes")
+
+
+def stream_json(queryset, serializer_class, context=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Serialize a queryset as a JSON array one chunk at a time.
+    Rows are fetched with .iterator() so memory stays bounded by chunk_size.
+    """
+    encoder = JSONEncoder()
+
+    def rows():
+        yield "["
+        first = True
+        chunk = []
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(obj)
+            if len(chunk) >= chunk_size:
+                for row in serializer_class(chunk, many=True, context=context).data:
+                    yield ("" if first else ",") + encoder.encode(row)
+                    first = False
+                chunk = []
+        for row in serializer_class(chunk, many=True, context=context).data:
+            yield ("" if first else ",") + encoder.encode(row)
+            first = False
+        yield "]"
+
+    return StreamingHttpResponse(rows(), content_type="application/json")
+
+
+class StreamingListMixin:
+    """
+    ListAPIView mixin: cursor-paginated by default, streamed as a single
+    JSON array when the client asks for ?stream=1.
+    """
+    stream_chunk_size = STREAM_CHUNK_SIZE
+
+    def list(self, request, *args, **kwargs):
+        if not wants_stream(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = getattr(self.pagination_class, "ordering", None)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return stream_json(
+            queryset,
+            self.get_serializer_class(),
+            context=self.get_serializer_context(),
+            chunk_size=self.stream_chunk_size,
+        )
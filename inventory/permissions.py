@@ -1,4 +1,46 @@
 from rest_framework import permissions
+from .cache import KEY_PREFIX, get_cache, get_versions, invalidate
+
+GROUP_CACHE_TIMEOUT = 600
+
+
+def group_namespaces(user_id):
+    # "groups" covers renames and deletions, "groups:<id>" one user's membership
+    return ["groups", f"groups:{user_id}"]
+
+
+def get_group_names(request):
+    """
+    The requesting user's group names, loaded at most once per request and
+    cached across requests until their membership or any group changes.
+    """
+    cached = getattr(request, "_inventory_group_names", None)
+    if cached is not None:
+        return cached
+
+    user = request.user
+    if not user or not user.is_authenticated:
+        names = frozenset()
+    else:
+        versions = get_versions(group_namespaces(user.pk))
+        key = f"{KEY_PREFIX}:groups:{user.pk}:" + ":".join(map(str, versions))
+        cache = get_cache()
+        names = cache.get(key)
+        if names is None:
+            names = frozenset(user.groups.values_list("name", flat=True))
+            cache.set(key, names, GROUP_CACHE_TIMEOUT)
+
+    request._inventory_group_names = names
+    return names
+
+
+def invalidate_user_groups(*user_ids):
+    invalidate(*(f"groups:{user_id}" for user_id in user_ids))
+
+
+def invalidate_all_groups():
+    invalidate("groups")
+
 
 class IsSalesPersonOrAdmin(permissions.BasePermission):
     """
@@ -11,4 +53,4 @@ class IsSalesPersonOrAdmin(permissions.BasePermission):
             return True
 
        
-        return request.user.groups.filter(name="Salesperson").exists()
+        return "Salesperson" in get_group_names(request)
@@ -0,0 +1,44 @@
+"""
+Query budgets for pytest runs.
+
+Enable with ``pytest -p inventory.pytest_plugin`` on top of a Django-aware
+pytest setup (pytest-django or an equivalent conftest). Tests opt in with
+
+    @pytest.mark.query_budget(5)
+    def test_product_list(client): ...
+
+and fail with the offending fingerprints and serializer fields when they
+run more queries than allowed or repeat one. ``--query-budget=N`` applies
+a default budget to every test that has no marker.
+"""
+import pytest
+
+from .querydetector import query_budget
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--query-budget", type=int, default=None,
+        help="fail tests that run more than this many queries or repeat one",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "query_budget(limit, allow_repeats=False): fail the test past limit queries",
+    )
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker("query_budget")
+    if marker is not None:
+        limit = marker.args[0] if marker.args else marker.kwargs.get("limit")
+        allow_repeats = marker.kwargs.get("allow_repeats", False)
+    else:
+        limit = item.config.getoption("query_budget")
+        allow_repeats = False
+        if limit is None:
+            return (yield)
+    with query_budget(limit, allow_repeats=allow_repeats):
+        return (yield)
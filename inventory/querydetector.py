@@ -0,0 +1,223 @@
+"""
+Slow-query and N+1 detection for development and tests.
+
+An execute wrapper fingerprints every query run while a QueryReport is
+active: literals and IN lists are folded so that the per-row lookups of
+an N+1 collapse onto one fingerprint. Each query is attributed to the
+serializer method or field that issued it by walking the stack, which is
+only affordable because this is a debug tool.
+
+QueryDetectorMiddleware logs a report for every request that repeats a
+fingerprint REPEAT_THRESHOLD times or runs a query slower than SLOW_MS.
+query_budget() is the test-side counterpart: it fails when a block runs
+more queries than allowed or repeats one, and inventory.pytest_plugin
+applies it to tests marked with @pytest.mark.query_budget. Code that
+runs a query per item by design (one UPDATE per product of a sale batch)
+wraps it in expected_repeats(); those queries still count towards a
+budget but are not reported as repeats.
+"""
+import contextvars
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import rest_framework
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.fields import Field
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+REST_FRAMEWORK_DIR = os.path.dirname(rest_framework.__file__)
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r"\bIN \((?:\s*(?:\?|%s)\s*,?)+\)", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+
+def get_options():
+    return getattr(settings, "INVENTORY_QUERY_DETECTOR", {})
+
+
+def fingerprint(sql):
+    """Normalize a statement so queries differing only by values compare equal"""
+    sql = STRING_LITERAL.sub("?", sql)
+    sql = NUMBER_LITERAL.sub("?", sql)
+    sql = IN_LIST.sub("IN (...)", sql)
+    return WHITESPACE.sub(" ", sql).strip()
+
+
+def query_origin():
+    """Name the serializer method or field whose code is running the query"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        owner = frame.f_locals.get("self")
+        # type() rather than isinstance(): isinstance() consults __class__,
+        # which evaluates lazy objects such as request.user and re-enters here
+        kind = type(owner)
+        if issubclass(kind, BaseSerializer):
+            # skip DRF's own machinery and report the first method we wrote
+            if not frame.f_code.co_filename.startswith(REST_FRAMEWORK_DIR):
+                return f"{type(owner).__name__}.{frame.f_code.co_name}"
+        elif issubclass(kind, Field):
+            parent = owner.parent
+            if parent is None:
+                return type(owner).__name__
+            return f"{type(parent).__name__}.{owner.field_name}"
+        frame = frame.f_back
+    return None
+
+
+class QueryReport:
+    def __init__(self, slow_ms=None, parent=None):
+        self.queries = []
+        self.expected = Counter()
+        self.slow_ms = get_options().get("SLOW_MS", 100) if slow_ms is None else slow_ms
+        # a budget around a test client call must still see the queries the
+        # middleware's own report collects for that request
+        self.parent = parent
+
+    def add(self, query, expected=False):
+        self.queries.append(query)
+        if expected:
+            self.expected[query[0]] += 1
+        if self.parent is not None:
+            self.parent.add(query, expected)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=2):
+        """[(fingerprint, count, origins)] for fingerprints run at least threshold times"""
+        counts = Counter(query[0] for query in self.queries) - self.expected
+        repeated = []
+        for key, count in counts.most_common():
+            if count < threshold:
+                break
+            origins = sorted({str(query[3]) for query in self.queries if query[0] == key})
+            repeated.append((key, count, origins))
+        return repeated
+
+    def slow(self):
+        limit = self.slow_ms / 1000
+        return [query for query in self.queries if query[2] > limit]
+
+    def describe(self, threshold=2):
+        lines = [f"{len(self.queries)} queries"]
+        for key, count, origins in self.repeated(threshold):
+            lines.append(f"  repeated {count}x from {', '.join(origins)}: {key}")
+        for key, sql, duration, origin in self.slow():
+            lines.append(f"  slow {duration * 1000:.1f}ms from {origin}: {sql}")
+        return "\n".join(lines)
+
+
+current = contextvars.ContextVar("inventory_query_report", default=None)
+expecting = contextvars.ContextVar("inventory_expected_repeats", default=False)
+
+
+@contextmanager
+def expected_repeats():
+    """Queries run inside are repeated on purpose; don't report them as an N+1"""
+    token = expecting.set(True)
+    try:
+        yield
+    finally:
+        expecting.reset(token)
+
+
+def detect_query(execute, sql, params, many, context):
+    report = current.get()
+    if report is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        report.add((fingerprint(sql), sql, time.perf_counter() - started, query_origin()), expecting.get())
+
+
+def install_detector(sender, connection, **kwargs):
+    if detect_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(detect_query)
+
+
+def install():
+    connection_created.connect(install_detector, dispatch_uid="inventory_query_detector")
+    for connection in connections.all(initialized_only=True):
+        install_detector(None, connection)
+
+
+@contextmanager
+def detecting(slow_ms=None):
+    install()
+    report = QueryReport(slow_ms, parent=current.get())
+    token = current.set(report)
+    try:
+        yield report
+    finally:
+        current.reset(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(limit=None, allow_repeats=False):
+    """
+    Fail the block if it runs more than limit queries or, unless
+    allow_repeats, the same fingerprint more than once
+    """
+    with detecting() as report:
+        yield report
+    problems = []
+    if limit is not None and len(report) > limit:
+        problems.append(f"query budget of {limit} exceeded")
+    if not allow_repeats and report.repeated():
+        problems.append("repeated queries")
+    if problems:
+        raise QueryBudgetExceeded(f"{' and '.join(problems)}: {report.describe()}")
+
+
+class QueryDetectorMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        options = get_options()
+        if not options.get("ENABLED", False):
+            raise MiddlewareNotUsed
+        self.repeat_threshold = options.get("REPEAT_THRESHOLD", 5)
+        self.get_response = get_response
+        install()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with detecting() as report:
+            response = self.get_response(request)
+        self.check(request, report)
+        return response
+
+    async def __acall__(self, request):
+        with detecting() as report:
+            response = await self.get_response(request)
+        self.check(request, report)
+        return response
+
+    def check(self, request, report):
+        if report.repeated(self.repeat_threshold) or report.slow():
+            logger.warning(
+                "%s %s: %s", request.method, request.path, report.describe(self.repeat_threshold)
+            )
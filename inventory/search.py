@@ -0,0 +1,228 @@
+"""
+Full-text search over Product.product_name and Product.description.
+
+SQLite keeps an FTS5 table and PostgreSQL a tsvector side table with a
+GIN index. Both are keyed by product id, kept in step by the Product
+signals and ranked with product_name weighted above description.
+Any other backend, or a SQLite build without FTS5, falls back to
+icontains filtering.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+
+from .models import Product
+
+FTS_TABLE = "inventory_product_fts"
+PG_TABLE = "inventory_product_search"
+MAX_TERMS = 16
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(text):
+    """Split user input into plain word tokens, dropping FTS syntax"""
+    return TOKEN_RE.findall((text or "").lower())[:MAX_TERMS]
+
+
+def get_connection():
+    return connections[router.db_for_write(Product)]
+
+
+# (alias, database name) pairs known to have an FTS5 table
+_sqlite_indexed = set()
+
+
+def backend_for(connection):
+    """Return 'sqlite', 'postgresql' or None when no index is available"""
+    if connection.vendor == "postgresql":
+        return "postgresql"
+    if connection.vendor == "sqlite":
+        key = (connection.alias, str(connection.settings_dict["NAME"]))
+        if key in _sqlite_indexed:
+            return "sqlite"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+            )
+            if cursor.fetchone():
+                _sqlite_indexed.add(key)
+                return "sqlite"
+    return None
+
+
+# Index maintenance
+
+def create_index(connection):
+    """Create the search table for this backend; returns False if unsupported"""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    "product_name, description, "
+                    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+                )
+            except Exception:
+                # SQLite compiled without FTS5
+                return False
+            return True
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {PG_TABLE} ("
+                "product_id bigint PRIMARY KEY "
+                "REFERENCES inventory_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {PG_TABLE}_document_idx ON {PG_TABLE} USING GIN (document)"
+            )
+            return True
+    return False
+
+
+def index_rows(connection, rows):
+    """Insert or replace (id, product_name, description) rows in the index"""
+    backend = backend_for(connection)
+    if backend is None or not rows:
+        return
+    rows = [(pk, name or "", description or "") for pk, name, description in rows]
+    with connection.cursor() as cursor:
+        if backend == "sqlite":
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, product_name, description) VALUES (%s, %s, %s)", rows
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {PG_TABLE} (product_id, document) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+
+def remove_rows(connection, ids):
+    backend = backend_for(connection)
+    if backend is None or not ids:
+        return
+    table, column = (FTS_TABLE, "rowid") if backend == "sqlite" else (PG_TABLE, "product_id")
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {table} WHERE {column} = %s", [(pk,) for pk in ids])
+
+
+def index_product(product):
+    index_rows(get_connection(), [(product.pk, product.product_name, product.description)])
+
+
+def remove_product(product_id):
+    remove_rows(get_connection(), [product_id])
+
+
+def rebuild_index(connection=None, batch_size=2000):
+    """Repopulate the whole index from the Product table"""
+    connection = connection or get_connection()
+    backend = backend_for(connection)
+    if backend is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE if backend == 'sqlite' else PG_TABLE}")
+    rows = Product.objects.using(connection.alias).order_by().values_list(
+        "id", "product_name", "description"
+    )
+    batch = []
+    count = 0
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            index_rows(connection, batch)
+            count += len(batch)
+            batch = []
+    index_rows(connection, batch)
+    return count + len(batch)
+
+
+# Querying
+
+class RankedSearchResults:
+    """
+    Lazy, sliceable result set in rank order.
+
+    Slicing runs one LIMIT/OFFSET query against the index and one
+    in_bulk() fetch, so it plugs straight into DRF's LimitOffsetPagination.
+    """
+
+    def __init__(self, terms, connection, backend):
+        self.terms = terms
+        self.connection = connection
+        self.backend = backend
+
+    def _match(self):
+        if self.backend == "sqlite":
+            expression = " ".join(f'"{term}"*' for term in self.terms)
+            return (
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), rowid DESC",
+                "rowid",
+                expression,
+            )
+        expression = " & ".join(f"{term}:*" for term in self.terms)
+        return (
+            f"FROM {PG_TABLE}, to_tsquery('simple', %s) query WHERE document @@ query",
+            "ORDER BY ts_rank(document, query) DESC, product_id DESC",
+            "product_id",
+            expression,
+        )
+
+    def count(self):
+        source, _, _, expression = self._match()
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) {source}", [expression])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def ids(self, limit, offset=0):
+        source, ordering, column, expression = self._match()
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {column} {source} {ordering} LIMIT %s OFFSET %s", [expression, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def fetch(self, ids):
+        products = Product.objects.using(self.connection.alias).in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError("Search results only support plain slices")
+        start = key.start or 0
+        if key.stop is None:
+            raise TypeError("Search results must be sliced with an upper bound")
+        return self.fetch(self.ids(max(key.stop - start, 0), start))
+
+    def iterator(self, chunk_size=500):
+        offset = 0
+        while True:
+            ids = self.ids(chunk_size, offset)
+            yield from self.fetch(ids)
+            if len(ids) < chunk_size:
+                return
+            offset += chunk_size
+
+
+def search_products(text):
+    """
+    Ranked, prefix-matching product search.
+    Returns RankedSearchResults, or a queryset when no index is available.
+    """
+    terms = search_terms(text)
+    connection = get_connection()
+    backend = backend_for(connection)
+    if backend is None or not terms:
+        return Product.objects.filter(
+            Q(product_name__icontains=text) | Q(description__icontains=text)
+        ).order_by("-date", "-id")
+    return RankedSearchResults(terms, connection, backend)
@@ -0,0 +1,117 @@
+"""
+Synthetic catalog and sales data for benchmarks.
+
+Rows are written with bulk_create, so no signals fire; the derived data
+(units_sold, the daily rollup and the search index) is rebuilt in bulk
+afterwards when `rebuild` is set. Each product gets its opening stock
+movement; seeded sales leave stock alone, so they have none.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from . import search
+from .models import Category, DailyProductSales, Product, Sale, StockMovement
+
+WORDS = [
+    "steel", "oak", "wireless", "compact", "deluxe", "classic", "portable", "ceramic",
+    "cotton", "digital", "outdoor", "kitchen", "office", "garden", "travel", "premium",
+    "lamp", "chair", "kettle", "speaker", "backpack", "blanket", "monitor", "keyboard",
+    "bottle", "charger", "mirror", "shelf", "jacket", "sneaker", "headphones", "drill",
+]
+
+
+@contextmanager
+def explicit_dates():
+    """Let seeded rows carry their own dates instead of auto_now/auto_now_add"""
+    fields = [Product._meta.get_field("date"), Sale._meta.get_field("date")]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def seed(products=1000, sales=10000, days=365, batch_size=5000, random_seed=0, rebuild=True, stdout=None,
+         categories=None):
+    """
+    Create `products` products, `categories` categories (one per product by
+    default, spread round-robin over the products otherwise) and `sales`
+    sales spread over the last `days` days. Returns the number of rows
+    created per model.
+    """
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    span = days * 24 * 3600
+    if categories is None:
+        categories = products
+
+    def log(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    created = []
+    catalog = []
+    with explicit_dates():
+        for offset in range(0, products, batch_size):
+            batch = []
+            for i in range(offset, min(offset + batch_size, products)):
+                name = " ".join(rng.sample(WORDS, 2)).title()
+                batch.append(Product(
+                    product_name=f"{name} {i}",
+                    description=" ".join(rng.choices(WORDS, k=8)),
+                    stock_quantity=rng.randint(100, 10000),
+                    price=Decimal(rng.randint(100, 50000)) / 100,
+                    date=now - timedelta(seconds=rng.randint(0, span)),
+                ))
+            batch = Product.objects.bulk_create(batch)
+            StockMovement.objects.bulk_create(
+                StockMovement(
+                    product=product, kind=StockMovement.ADJUSTMENT, quantity=product.stock_quantity,
+                    note="Opening stock", created_at=product.date,
+                )
+                for product in batch
+            )
+            created.extend(batch)
+        log(f"Seeded {len(created)} products")
+
+        for offset in range(0, categories if created else 0, batch_size):
+            owners = [created[i % len(created)] for i in range(offset, min(offset + batch_size, categories))]
+            batch = Category.objects.bulk_create(
+                Category(product=product, name=rng.choice(WORDS).title()) for product in owners
+            )
+            catalog.extend((product.pk, category.pk, product.price) for product, category in zip(owners, batch))
+        log(f"Seeded {len(catalog)} categories")
+
+        if not catalog:
+            sales = 0
+        for offset in range(0, sales, batch_size):
+            batch = []
+            for _ in range(min(batch_size, sales - offset)):
+                product_id, category_id, price = rng.choice(catalog)
+                quantity = rng.randint(1, 5)
+                batch.append(Sale(
+                    product_id=product_id,
+                    category_id=category_id,
+                    quantity_sold=quantity,
+                    unit_price=price,
+                    total_sale=price * quantity,
+                    date=now - timedelta(seconds=rng.randint(0, span)),
+                ))
+            Sale.objects.bulk_create(batch)
+            if (offset // batch_size) % 20 == 0:
+                log(f"Seeded {offset + len(batch)} of {sales} sales")
+
+    if rebuild:
+        Product.objects.rebuild_units_sold()
+        DailyProductSales.objects.rebuild()
+        search.rebuild_index()
+        log("Rebuilt units_sold, daily rollup and search index")
+
+    return {"products": len(created), "categories": len(catalog), "sales": sales}
@@ -1,10 +1,17 @@
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import F
 from rest_framework import serializers
-from .models import Product, Category, Sale
+from .models import Alert, Product, Category, Sale, DailyProductSales, StockMovement, rollup_delta
+from .cache import invalidate_product
+from . import tasks
+from .metrics import TimedSerializerMixin
+from .querydetector import expected_repeats
 from django.contrib.auth.password_validation import validate_password
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     first_name = serializers.CharField(max_length=155)
     last_name = serializers.CharField(max_length=255)
     
@@ -18,7 +25,8 @@ class UserSerializer(serializers.ModelSerializer):
             "email",
             "password",
         ]
-        
+        extra_kwargs = {"password": {"write_only": True}}
+
     def create(self, validated_data):
         password = validated_data.pop('password')
         user = User.objects.create_user(**validated_data,password=password)
@@ -31,28 +39,49 @@ class UserSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     image = serializers.ImageField(required=False)
+    thumbnails = serializers.SerializerMethodField()
     remaining_stock = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
         fields = [
             'id',
+            'sku',
             'product_name',
             'description',
             'stock_quantity',
             'price',
             'date',
             'image',
-            'remaining_stock'
+            'thumbnails',
+            'remaining_stock',
+            'reorder_threshold',
         ]
         read_only_fields = ['date']
 
+    def get_thumbnails(self, obj):
+        """Thumbnail URLs by size once the worker has rendered them for the current image"""
+        variants = obj.image_variants
+        if not obj.image or variants.get('source') != obj.image.name:
+            return {}
+        request = self.context.get('request')
+        urls = {}
+        for size, name in variants.items():
+            if size == 'source':
+                continue
+            url = obj.image.storage.url(name)
+            urls[size] = request.build_absolute_uri(url) if request is not None else url
+        return urls
+
     def get_remaining_stock(self, obj):
-        """Calculate remaining stock after all sales"""
-        total_sales = sum(sale.quantity_sold for sale in obj.sale_set.all())
-        return obj.stock_quantity - total_sales
+        """Units on hand after all sales; the same figure the stock ledger gives for now"""
+        return obj.remaining_stock
+
+    def validate_sku(self, value):
+        # blank SKUs are stored as NULL so they don't collide on the unique index
+        return value or None
 
     def validate_stock_quantity(self, value):
         if value < 0:
@@ -64,8 +93,14 @@ class ProductSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Price must be greater than zero")
         return value
 
+    def update(self, instance, validated_data):
+        # One transaction, so the stock ledger's delta is taken against
+        # the row this save overwrites (see signals.remember_stock)
+        with transaction.atomic():
+            return super().update(instance, validated_data)
+
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # Using nested serializer for product details
     product = ProductSerializer()
     sales_count = serializers.SerializerMethodField()
@@ -75,6 +110,9 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'product', 'sales_count']
 
     def get_sales_count(self, obj):
+        # Annotated by Category.objects.with_sales_count() on list views
+        if hasattr(obj, 'sales_count'):
+            return obj.sales_count
         return obj.sales.count()
 
     def create(self, validated_data):
@@ -86,7 +124,151 @@ class CategorySerializer(serializers.ModelSerializer):
         return category
 
 
-class SaleSerializer(serializers.ModelSerializer):
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that resolves against rows a parent list serializer
+    has already fetched (context['prefetched'][model]) before querying.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.get_queryset().model)
+        if prefetched is not None and not isinstance(data, bool):
+            try:
+                return prefetched[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+class SaleListSerializer(serializers.ListSerializer):
+    """
+    Batch validation and creation of sales.
+
+    Every Product and Category referenced by the batch is loaded up front,
+    invalid rows are reported in `item_errors` instead of failing the whole
+    batch, valid rows are inserted with bulk_create and stock is taken with
+    one conditional UPDATE per product.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+        self.prefetch_related_rows(data)
+
+        valid = []
+        self.item_errors = []
+        for index, item in enumerate(data):
+            try:
+                valid.append(self.child.run_validation(item))
+            except serializers.ValidationError as exc:
+                self.item_errors.append({"index": index, "errors": exc.detail})
+        failed = {error["index"] for error in self.item_errors}
+        self.valid_indexes = [index for index in range(len(data)) if index not in failed]
+        return valid
+
+    def prefetch_related_rows(self, data):
+        def ids(key):
+            found = set()
+            for item in data:
+                try:
+                    found.add(int(item.get(key)))
+                except (AttributeError, TypeError, ValueError):
+                    pass
+            return found
+
+        categories = Category.objects.select_related('product').in_bulk(ids('category'))
+        products = {category.product_id: category.product for category in categories.values()}
+        missing = ids('product') - products.keys()
+        if missing:
+            products.update(Product.objects.in_bulk(missing))
+        self.context['prefetched'] = {Product: products, Category: categories}
+
+    def create(self, validated_data):
+        by_product = {}
+        for position, item in enumerate(validated_data):
+            by_product.setdefault(item['product'].pk, []).append(position)
+
+        accepted = []
+        with transaction.atomic():
+            # one conditional UPDATE per product is the design, not an N+1
+            with expected_repeats():
+                for product_id, positions in by_product.items():
+                    positions = self.take_stock(product_id, positions, validated_data)
+                    accepted.extend(positions)
+            accepted.sort()
+
+            sales = []
+            for position in accepted:
+                item = validated_data[position]
+                sales.append(Sale(
+                    total_sale=item['quantity_sold'] * item['unit_price'],
+                    **item
+                ))
+            sales = Sale.objects.bulk_create(sales)
+            StockMovement.objects.bulk_create(
+                StockMovement(product_id=sale.product_id, kind=StockMovement.SALE, quantity=-sale.quantity_sold, sale=sale)
+                for sale in sales
+            )
+            # bulk_create sends no post_save, so roll the batch up and
+            # invalidate cached product responses here
+            if tasks.is_deferred('rollup'):
+                tasks.enqueue('sales.rollup', *(rollup_delta(sale) for sale in sales))
+            else:
+                with expected_repeats():
+                    DailyProductSales.objects.apply_sales(sales)
+            product_ids = {sale.product_id for sale in sales}
+            if tasks.is_deferred('alerts'):
+                tasks.enqueue('products.evaluate_alerts', *({'product_id': pk} for pk in product_ids))
+            else:
+                Alert.objects.evaluate(product_ids)
+            if tasks.is_deferred('cache'):
+                tasks.enqueue('products.invalidate_cache', *({'product_id': pk} for pk in product_ids))
+            else:
+                for product_id in product_ids:
+                    invalidate_product(product_id)
+
+        # Rows that lost the race for stock become per-item errors
+        rejected = set(range(len(validated_data))) - set(accepted)
+        for position in sorted(rejected):
+            self.item_errors.append({
+                "index": self.valid_indexes[position],
+                "errors": {"quantity_sold": ["Not enough stock available."]},
+            })
+        self.item_errors.sort(key=lambda error: error["index"])
+        return sales
+
+    def take_stock(self, product_id, positions, validated_data, attempts=3):
+        """
+        Decrement stock for all of a product's rows in one UPDATE.
+        If the batch does not fit, keep the leading rows that do.
+        Returns the positions that were accepted.
+        """
+        wanted = positions
+        for _ in range(attempts):
+            if not wanted:
+                return []
+            total = sum(validated_data[position]['quantity_sold'] for position in wanted)
+            updated = Product.objects.filter(pk=product_id, stock_quantity__gte=total).update(
+                stock_quantity=F('stock_quantity') - total,
+                units_sold=F('units_sold') + total,
+            )
+            if updated:
+                return wanted
+
+            available = Product.objects.filter(pk=product_id).values_list('stock_quantity', flat=True).first() or 0
+            wanted = []
+            for position in positions:
+                quantity = validated_data[position]['quantity_sold']
+                if quantity > available:
+                    break
+                available -= quantity
+                wanted.append(position)
+        return []
+
+
+class SaleSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    product = PrefetchedPrimaryKeyRelatedField(queryset=Product.objects.all())
+    category = PrefetchedPrimaryKeyRelatedField(queryset=Category.objects.all())
     product_name = serializers.CharField(source='product.product_name', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
 
@@ -104,6 +286,7 @@ class SaleSerializer(serializers.ModelSerializer):
             'total_sale'
         ]
         read_only_fields = ['date', 'total_sale']
+        list_serializer_class = SaleListSerializer
 
     def validate(self, data):
         """
@@ -127,7 +310,7 @@ class SaleSerializer(serializers.ModelSerializer):
             })
 
         # Validate category matches product
-        if data['category'].product != product:
+        if data['category'].product_id != product.pk:
             raise serializers.ValidationError({
                 "category": "Category must match the product's category"
             })
@@ -138,17 +321,100 @@ class SaleSerializer(serializers.ModelSerializer):
         # Calculate total sale
         validated_data['total_sale'] = validated_data['quantity_sold'] * validated_data['unit_price']
         
-        # Create the sale
-        sale = Sale.objects.create(**validated_data)
-        
-        # Update product quantity
         product = validated_data['product']
-        product.update_quantity(-validated_data['quantity_sold'])
-        
+        quantity_sold = validated_data['quantity_sold']
+
+        with transaction.atomic():
+            # Take the stock first: the conditional UPDATE is the real
+            # availability check, validate() only saw a possibly stale row
+            if not product.decrement_stock(quantity_sold):
+                raise serializers.ValidationError({
+                    "quantity_sold": f"Cannot sell {quantity_sold} units. Not enough stock available."
+                })
+
+            # Create the sale (units_sold is bumped by the post_save signal)
+            sale = Sale.objects.create(**validated_data)
+            StockMovement.objects.create(
+                product_id=product.pk, kind=StockMovement.SALE, quantity=-quantity_sold, sale=sale,
+            )
+
         return sale
 
 
 
+class AlertSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.product_name', read_only=True)
+
+    class Meta:
+        model = Alert
+        fields = [
+            'id',
+            'product',
+            'product_name',
+            'status',
+            'threshold',
+            'stock_quantity',
+            'opened_at',
+            'resolved_at',
+        ]
+        read_only_fields = fields
+
+
+class SaleReadSerializer(TimedSerializerMixin, serializers.BaseSerializer):
+    """
+    Read-only serializer for sale rows projected with .values(SALE_LIST_FIELDS).
+    Skips DRF field machinery; output matches SaleSerializer.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Resolved once; looking it up per row dominates serialization time
+        self.timezone = timezone.get_current_timezone()
+
+    def to_representation(self, row):
+        category = row['category']
+        return {
+            'id': row['id'],
+            'product': row['product'],
+            'product_name': row['product__product_name'],
+            'category': category,
+            'category_name': row['category__name'] if category is not None else None,
+            'date': format_datetime(row['date'], self.timezone),
+            'quantity_sold': row['quantity_sold'],
+            'unit_price': format_decimal(row['unit_price']),
+            'total_sale': format_decimal(row['total_sale']),
+        }
+
+
+SALE_LIST_FIELDS = (
+    'id',
+    'product',
+    'product__product_name',
+    'category',
+    'category__name',
+    'date',
+    'quantity_sold',
+    'unit_price',
+    'total_sale',
+)
+
+
+def format_datetime(value, tz):
+    """Same output as DRF's DateTimeField: ISO 8601 in `tz`, 'Z' for UTC"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(tz)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def format_decimal(value):
+    return None if value is None else f"{value:f}"
+
+
 class PasswordChangeSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True)
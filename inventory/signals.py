@@ -0,0 +1,254 @@
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .models import Alert, Category, DailyProductSales, Product, Sale, StockMovement, rollup_delta
+from rest_framework.authtoken.models import Token
+from . import cache, images, search, tasks
+from .authentication import CACHED_USER_FIELDS, token_cache
+from .permissions import invalidate_all_groups, invalidate_user_groups
+
+
+@receiver(pre_save, sender=Sale)
+def remember_sale(sender, instance, raw=False, **kwargs):
+    """Read the stored sale so an edit (e.g. in the admin) can be applied as a difference"""
+    instance._saved_sale = None
+    if raw or instance._state.adding:
+        return
+    instance._saved_sale = Sale.objects.filter(pk=instance.pk).only(
+        'product', 'date', 'quantity_sold', 'unit_price', 'total_sale'
+    ).first()
+
+
+def edited_quantities(instance):
+    """{product_id: change in units sold} for a saved edit of a sale; empty if nothing moved"""
+    previous = getattr(instance, '_saved_sale', None)
+    if previous is None:
+        return {}
+    changes = {previous.product_id: -previous.quantity_sold}
+    changes[instance.product_id] = changes.get(instance.product_id, 0) + instance.quantity_sold
+    return {product_id: change for product_id, change in changes.items() if change}
+
+
+@receiver(post_save, sender=Sale)
+def add_units_sold(sender, instance, created, **kwargs):
+    """
+    Keep Product.units_sold in step with sales. New sales have already
+    taken their stock; an edited sale moves stock by the difference.
+    """
+    if created:
+        Product.objects.filter(pk=instance.product_id).update(
+            units_sold=F('units_sold') + instance.quantity_sold
+        )
+        return
+    # returns first, so moving a sale between products frees the old stock before taking new
+    for product_id, change in sorted(edited_quantities(instance).items(), key=lambda item: item[1]):
+        products = Product.objects.filter(pk=product_id)
+        if change > 0:
+            # the same conditional UPDATE as Product.decrement_stock()
+            products = products.filter(stock_quantity__gte=change)
+        updated = products.update(
+            stock_quantity=F('stock_quantity') - change,
+            units_sold=Greatest(F('units_sold') + change, 0),
+        )
+        if not updated:
+            raise ValidationError({'quantity_sold': f'Not enough stock to sell {change} more units'})
+        StockMovement.objects.create(
+            product_id=product_id, kind=StockMovement.SALE if change > 0 else StockMovement.RETURN,
+            quantity=-change, sale=instance, note=f'Sale {instance.pk} edited',
+        )
+
+
+def deleting_product(origin):
+    """True when a delete cascades from products, which takes their sales along"""
+    return isinstance(origin, Product) or getattr(origin, 'model', None) is Product
+
+
+@receiver(post_delete, sender=Sale)
+def remove_units_sold(sender, instance, origin=None, **kwargs):
+    """Deleting a sale voids it: its units return to stock and leave units_sold"""
+    if deleting_product(origin):
+        return
+    Product.objects.filter(pk=instance.product_id).update(
+        stock_quantity=F('stock_quantity') + instance.quantity_sold,
+        units_sold=Greatest(F('units_sold') - instance.quantity_sold, 0),
+    )
+    StockMovement.objects.create(
+        product_id=instance.product_id, kind=StockMovement.RETURN, quantity=instance.quantity_sold,
+        note=f'Sale {instance.pk} deleted',
+    )
+    if tasks.is_deferred('alerts'):
+        tasks.enqueue('products.evaluate_alerts', {'product_id': instance.product_id})
+    else:
+        Alert.objects.evaluate([instance.product_id])
+
+
+@receiver(post_save, sender=Sale)
+def add_to_daily_rollup(sender, instance, created, **kwargs):
+    deltas = [rollup_delta(instance)]
+    if not created:
+        previous = getattr(instance, '_saved_sale', None)
+        if previous is None or rollup_delta(previous) == deltas[0]:
+            return
+        # an edit takes the old sale out of its day's row and adds the new one
+        deltas.insert(0, rollup_delta(previous, sign=-1))
+    if tasks.is_deferred('rollup'):
+        for delta in deltas:
+            tasks.enqueue('sales.rollup', delta)
+    else:
+        DailyProductSales.objects.apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Sale)
+def remove_from_daily_rollup(sender, instance, **kwargs):
+    if tasks.is_deferred('rollup'):
+        tasks.enqueue('sales.rollup', rollup_delta(instance, sign=-1))
+    else:
+        DailyProductSales.objects.apply_sales([instance], sign=-1)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    """Keep the full-text search index in step with product text"""
+    if update_fields is not None and not {'product_name', 'description'} & set(update_fields):
+        return
+    search.index_product(instance)
+
+
+@receiver(pre_save, sender=Product)
+def remember_stock(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Read the stored stock so record_stock_change() can ledger the difference"""
+    instance._stock_before = None
+    if raw or instance._state.adding or (update_fields is not None and 'stock_quantity' not in update_fields):
+        return
+    rows = Product.objects.filter(pk=instance.pk)
+    if transaction.get_connection().in_atomic_block:
+        # hold the row until the save commits, so no sale slips in between
+        rows = rows.select_for_update()
+    instance._stock_before = rows.values_list('stock_quantity', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def record_stock_change(sender, instance, created, raw=False, **kwargs):
+    """
+    Saving a product with a new stock figure goes in the ledger: raising it
+    is a restock, lowering it (or the opening figure) an adjustment
+    """
+    if raw:
+        return
+    if created:
+        change, note = instance.stock_quantity, 'Opening stock'
+    elif getattr(instance, '_stock_before', None) is not None:
+        change, note = instance.stock_quantity - instance._stock_before, 'Stock edited'
+    else:
+        return
+    # a zero opening movement still marks where the product's history starts
+    if change or created:
+        kind = StockMovement.RESTOCK if change > 0 and not created else StockMovement.ADJUSTMENT
+        StockMovement.objects.create(product_id=instance.pk, kind=kind, quantity=change, note=note)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def schedule_product_thumbnails(sender, instance, update_fields=None, **kwargs):
+    """Render thumbnails for a newly attached image off the request"""
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if instance.image and instance.image_variants.get('source') != instance.image.name:
+        images.schedule_thumbnails(instance.image.name)
+
+
+@receiver(post_save, sender=Sale)
+def evaluate_sale_alerts(sender, instance, created, **kwargs):
+    """A sale lowers its product's stock; check it against the reorder threshold"""
+    product_ids = [instance.product_id] if created else list(edited_quantities(instance))
+    if not product_ids:
+        return
+    if tasks.is_deferred('alerts'):
+        for product_id in product_ids:
+            tasks.enqueue('products.evaluate_alerts', {'product_id': product_id})
+    else:
+        Alert.objects.evaluate(product_ids)
+
+
+@receiver(post_save, sender=Product)
+def evaluate_product_alerts(sender, instance, created, update_fields=None, **kwargs):
+    """Edits to stock or to the threshold itself can open or resolve an alert"""
+    if update_fields is not None and not {'stock_quantity', 'reorder_threshold'} & set(update_fields):
+        return
+    if created and instance.reorder_threshold is None:
+        return
+    Alert.objects.evaluate([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    cache.invalidate_product(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    cache.invalidate_categories()
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+def invalidate_sale_product_cache(sender, instance, **kwargs):
+    # Sales change the product's stock and units sold, and category sales counts
+    product_ids = {instance.product_id, *edited_quantities(instance)}
+    for product_id in product_ids:
+        if tasks.is_deferred('cache'):
+            tasks.enqueue('products.invalidate_cache', {'product_id': product_id})
+        else:
+            cache.invalidate_product(product_id)
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Logout deletes the token; stop accepting it from the cache"""
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Deactivation and password changes save the user; drop any cached
+    tokens so the next request re-reads the user from the database.
+    """
+    if created:
+        return
+    # e.g. login's last_login update touches nothing the cache holds
+    if update_fields is not None and not {'password', *CACHED_USER_FIELDS} & set(update_fields):
+        return
+    token_cache.delete_user(instance.pk)
+    keys = list(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+    if keys:
+        token_cache.delete(*keys)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def forget_group_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_user_groups(instance.pk)
+    elif action == 'pre_clear':
+        # group.user_set.clear(): pk_set is empty, collect members first
+        invalidate_user_groups(*instance.user_set.values_list('pk', flat=True))
+    elif pk_set:
+        invalidate_user_groups(*pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def forget_all_group_names(sender, instance, **kwargs):
+    invalidate_all_groups()
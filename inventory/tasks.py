@@ -0,0 +1,164 @@
+"""
+Database-backed task queue for work that need not finish inside a request.
+
+enqueue() inserts Task rows in the caller's transaction, so a task exists
+exactly when the change that produced it commits and no broker is
+needed. `manage.py run_tasks` claims due tasks in batches and passes each
+batch of one task name to its handler in a single call, letting handlers
+coalesce work (one rollup UPDATE per product and day for any number of
+sales). Finished tasks are deleted; failing ones are retried with
+exponential backoff until max_attempts and then kept as FAILED.
+
+Claiming is a conditional UPDATE from pending to running, which is safe
+with several workers on any backend. A task left running by a worker
+that died is reclaimed once its lease has expired.
+"""
+import logging
+import os
+import socket
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import invalidate_product
+from .images import generate_thumbnails
+from .models import Alert, DailyProductSales, Task
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+
+def get_options():
+    return getattr(settings, "INVENTORY_TASKS", {})
+
+
+def is_deferred(effect):
+    """Whether the sale side effect `effect` ('rollup', 'cache', 'alerts') goes through the queue"""
+    return effect in get_options().get("DEFERRED_SALE_EFFECTS", ())
+
+
+def task(name, max_attempts=5):
+    """Register a handler taking a list of payloads under `name`"""
+    def register(handler):
+        REGISTRY[name] = (handler, max_attempts)
+        return handler
+    return register
+
+
+def enqueue(name, *payloads, delay=None):
+    """Queue one task per payload, committed along with the caller's transaction"""
+    max_attempts = REGISTRY[name][1]
+    run_after = timezone.now() + (delay or timedelta())
+    return Task.objects.bulk_create(
+        Task(name=name, payload=payload, max_attempts=max_attempts, run_after=run_after)
+        for payload in payloads
+    )
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim(worker, batch_size):
+    """Mark up to batch_size due tasks as running for `worker` and return them"""
+    now = timezone.now()
+    lease = timedelta(seconds=get_options().get("LEASE_SECONDS", 300))
+    claimable = Q(status=Task.PENDING, run_after__lte=now) | Q(status=Task.RUNNING, locked_at__lt=now - lease)
+    ids = list(Task.objects.filter(claimable).order_by("run_after", "pk").values_list("pk", flat=True)[:batch_size])
+    if not ids:
+        return []
+    # Rows another worker claimed in between no longer match `claimable`
+    Task.objects.filter(claimable, pk__in=ids).update(
+        status=Task.RUNNING, locked_by=worker, locked_at=now, attempts=F("attempts") + 1,
+    )
+    return list(Task.objects.filter(pk__in=ids, status=Task.RUNNING, locked_by=worker, locked_at=now))
+
+
+def retry_later(task_row, error):
+    task_row.last_error = error
+    task_row.locked_by = ""
+    task_row.locked_at = None
+    if task_row.attempts >= task_row.max_attempts:
+        task_row.status = Task.FAILED
+        logger.error("Task %s %s failed for good: %s", task_row.pk, task_row.name, error)
+    else:
+        task_row.status = Task.PENDING
+        backoff = min(2 ** task_row.attempts, get_options().get("MAX_BACKOFF_SECONDS", 300))
+        task_row.run_after = timezone.now() + timedelta(seconds=backoff)
+    task_row.save(update_fields=["status", "run_after", "locked_by", "locked_at", "last_error"])
+
+
+def run_group(handler, rows):
+    with transaction.atomic():
+        handler([row.payload for row in rows])
+        Task.objects.filter(pk__in=[row.pk for row in rows]).delete()
+
+
+def process(rows):
+    """Run claimed tasks, one handler call per task name"""
+    groups = defaultdict(list)
+    for row in rows:
+        groups[row.name].append(row)
+    for name, group in groups.items():
+        if name not in REGISTRY:
+            for row in group:
+                row.attempts = row.max_attempts
+                retry_later(row, f"No handler registered for {name}")
+            continue
+        handler = REGISTRY[name][0]
+        try:
+            run_group(handler, group)
+            continue
+        except Exception as exc:
+            if len(group) == 1:
+                logger.exception("Task %s %s failed", group[0].pk, name)
+                retry_later(group[0], repr(exc))
+                continue
+        # Find the bad payloads without holding back the rest of the batch
+        for row in group:
+            try:
+                run_group(handler, [row])
+            except Exception as exc:
+                logger.exception("Task %s %s failed", row.pk, name)
+                retry_later(row, repr(exc))
+
+
+def run_pending(batch_size=None, worker=None):
+    """Process due tasks until none are left; returns how many were claimed"""
+    batch_size = batch_size or get_options().get("BATCH_SIZE", 100)
+    worker = worker or worker_id()
+    total = 0
+    while True:
+        rows = claim(worker, batch_size)
+        if not rows:
+            return total
+        process(rows)
+        total += len(rows)
+
+
+@task("sales.rollup")
+def roll_up_sales(deltas):
+    DailyProductSales.objects.apply_deltas(deltas)
+
+
+@task("products.invalidate_cache")
+def invalidate_product_caches(payloads):
+    for product_id in {payload["product_id"] for payload in payloads}:
+        invalidate_product(product_id)
+
+
+@task("products.evaluate_alerts")
+def evaluate_alerts(payloads):
+    Alert.objects.evaluate(payload["product_id"] for payload in payloads)
+
+
+@task("products.thumbnails")
+def render_thumbnails(payloads):
+    for name in {payload["name"] for payload in payloads}:
+        generate_thumbnails(name)
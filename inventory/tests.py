@@ -1,3 +1,1302 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import tasks
+from .authentication import TokenUserCache, token_cache
+from .benchmark import WORKLOADS, Dataset, run_in_process
+from .hashers import PBKDF2PasswordHasher, hasher_list
+from .pagination import StreamingListMixin
+from .permissions import IsSalesPersonOrAdmin
+from .models import Alert, Product, Category, Sale, DailyProductSales, StockMovement, StockSnapshot, Task
+from .querydetector import QueryBudgetExceeded, detecting, fingerprint, query_budget
+from .seed import seed
+from .serializers import CategorySerializer, SaleSerializer
+from .throttling import MemoryBuckets, memory_buckets
+
+# The in-process buckets outlive each test; only ThrottlingTests, which
+# clears them, runs with the route budgets on.
+without_throttling = override_settings(INVENTORY_THROTTLING={**settings.INVENTORY_THROTTLING, "ENABLED": False})
+
+
+@without_throttling
+class InventoryTestCase(TestCase):
+    pass
+
+
+def make_product(stock=10, price="2.00"):
+    product = Product.objects.create(product_name="Widget", stock_quantity=stock, price=Decimal(price))
+    category = Category.objects.create(product=product, name="Widgets")
+    return product, category
+
+
+class SaleCreateTests(InventoryTestCase):
+    def test_sale_decrements_stock_and_counts_units(self):
+        product, category = make_product(stock=10)
+        serializer = SaleSerializer(data={
+            "product": product.pk,
+            "category": category.pk,
+            "quantity_sold": 3,
+            "unit_price": "2.00",
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 7)
+        self.assertEqual(product.units_sold, 3)
+
+    def test_stale_row_cannot_oversell(self):
+        product, category = make_product(stock=5)
+        serializer = SaleSerializer(data={
+            "product": product.pk,
+            "category": category.pk,
+            "quantity_sold": 4,
+            "unit_price": "2.00",
+        })
+        serializer.is_valid(raise_exception=True)
+        # Another checkout takes the stock after validation saw it
+        Product.objects.filter(pk=product.pk).update(stock_quantity=2)
+
+        with self.assertRaises(serializers.ValidationError):
+            serializer.save()
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 2)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_edited_sale_moves_units_by_the_difference(self):
+        product, category = make_product(stock=10)
+        other, other_category = make_product(stock=10)
+        serializer = SaleSerializer(data={
+            "product": product.pk,
+            "category": category.pk,
+            "quantity_sold": 3,
+            "unit_price": "2.00",
+        })
+        serializer.is_valid(raise_exception=True)
+        sale = serializer.save()
+
+        sale.quantity_sold = 5
+        sale.save()
+        product.refresh_from_db()
+        self.assertEqual((product.stock_quantity, product.units_sold), (5, 5))
+
+        sale.product, sale.category = other, other_category
+        sale.save()
+        product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((product.stock_quantity, product.units_sold), (10, 0))
+        self.assertEqual((other.stock_quantity, other.units_sold), (5, 5))
+        self.assertEqual(product.quantity_left(timezone.now()), 10)
+        self.assertEqual(other.quantity_left(timezone.now()), 5)
+
+    def test_edit_cannot_oversell(self):
+        product, category = make_product(stock=5)
+        sale = Sale.objects.create(product=product, category=category, quantity_sold=3, unit_price=product.price)
+        Product.objects.filter(pk=product.pk).update(stock_quantity=2, units_sold=3)
+
+        sale.quantity_sold = 6
+        with self.assertRaises(DjangoValidationError):
+            sale.full_clean()
+        with self.assertRaises(DjangoValidationError):
+            sale.save()
+
+        sale.refresh_from_db()
+        product.refresh_from_db()
+        self.assertEqual(sale.quantity_sold, 3)
+        self.assertEqual((product.stock_quantity, product.units_sold), (2, 3))
+        self.assertFalse(product.stock_movements.filter(sale=sale).exists())
+
+
+class SaleBulkCreateTests(InventoryTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def test_batch_reports_item_errors_without_aborting(self):
+        product, category = make_product(stock=5)
+        rows = [
+            {"product": product.pk, "category": category.pk, "quantity_sold": 2, "unit_price": "2.00"}
+            for _ in range(3)
+        ]
+        rows.append({"product": 999, "category": category.pk, "quantity_sold": 1, "unit_price": "2.00"})
+
+        response = self.client.post(reverse("bulk-create-sale"), rows, format="json")
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data["created"]), 2)
+        self.assertEqual([error["index"] for error in response.data["errors"]], [2, 3])
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 1)
+        self.assertEqual(product.units_sold, 4)
+
+    def test_null_category_is_a_row_error(self):
+        product, category = make_product(stock=5)
+        rows = [
+            {"product": product.pk, "category": None, "quantity_sold": 1, "unit_price": "2.00"},
+            {"product": product.pk, "category": category.pk, "quantity_sold": 1, "unit_price": "2.00"},
+        ]
+
+        response = self.client.post(reverse("bulk-create-sale"), rows, format="json")
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data["errors"], [{"index": 0, "errors": {"category": ["This field may not be null."]}}])
+        self.assertEqual(Sale.objects.count(), 1)
+
+        response = self.client.post(reverse("bulk-create-sale"), rows[:1], format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse("create-sale"), rows[0], format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_ndjson_body(self):
+        product, category = make_product(stock=5)
+        row = json.dumps({"product": product.pk, "category": category.pk, "quantity_sold": 1, "unit_price": "2.00"})
+
+        response = self.client.post(
+            reverse("bulk-create-sale"), "\n".join([row, row]), content_type="application/x-ndjson"
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Sale.objects.count(), 2)
+
+
+class SalesListTests(InventoryTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def test_lean_rows_match_model_serializer(self):
+        product, category = make_product()
+        sale = Sale.objects.create(product=product, category=category, quantity_sold=2, unit_price=product.price)
+
+        [row] = self.client.get(reverse("list-sale")).data["results"]
+
+        self.assertEqual(row, SaleSerializer(sale).data)
+
+    def test_filters_by_product_and_date_range(self):
+        product, category = make_product()
+        other, other_category = make_product()
+        Sale.objects.create(product=product, category=category, quantity_sold=1, unit_price=product.price)
+        Sale.objects.create(product=other, category=other_category, quantity_sold=1, unit_price=other.price)
+        today = timezone.localdate()
+
+        response = self.client.get(reverse("list-sale"), {"product": product.pk, "start": today, "end": today})
+        self.assertEqual([row["product"] for row in response.data["results"]], [product.pk])
+
+        response = self.client.get(reverse("list-sale"), {"end": today - timedelta(days=1)})
+        self.assertEqual(response.data["results"], [])
+
+        self.assertEqual(self.client.get(reverse("list-sale"), {"start": "soon"}).status_code, 400)
+
+
+class ListPaginationTests(InventoryTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        self.products = [make_product()[0] for _ in range(5)]
+
+    def walk(self, url, **params):
+        rows, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            rows.extend(response.data["results"])
+            pages += 1
+            if response.data["next"] is None:
+                return rows, pages
+            response = self.client.get(response.data["next"])
+
+    def test_cursor_pages_cover_every_row_once(self):
+        rows, pages = self.walk(reverse("list"), page_size=2)
+
+        self.assertEqual(pages, 3)
+        self.assertEqual([row["id"] for row in rows], [product.pk for product in reversed(self.products)])
+        self.assertNotIn("count", self.client.get(reverse("list"), {"page_size": 2}).data)
+
+    def test_streamed_list_matches_the_pages(self):
+        for product in self.products[:3]:
+            Sale.objects.create(product=product, category=product.category_set.get(),
+                                quantity_sold=1, unit_price=product.price)
+
+        for url in (reverse("list"), reverse("list-sale")):
+            # small chunks, so rows from several chunks are joined into one array
+            with self.subTest(url=url), mock.patch.object(StreamingListMixin, "stream_chunk_size", 2):
+                paged, _ = self.walk(url, page_size=2)
+                response = self.client.get(url, {"stream": 1})
+
+                self.assertTrue(response.streaming)
+                self.assertEqual(response["Content-Type"], "application/json")
+                self.assertEqual(json.loads(b"".join(response.streaming_content)), json.loads(json.dumps(paged)))
+
+
+class SalesAnalyticsTests(InventoryTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def sell(self, product, category, quantity):
+        serializer = SaleSerializer(data={
+            "product": product.pk,
+            "category": category.pk,
+            "quantity_sold": quantity,
+            "unit_price": str(product.price),
+        })
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_rollup_follows_sales(self):
+        product, category = make_product(stock=20)
+        self.sell(product, category, 2)
+        sale = self.sell(product, category, 3)
+        sale.delete()
+        self.sell(product, category, 4)
+
+        response = self.client.get(reverse("sales"))
+
+        self.assertEqual(response.status_code, 200)
+        [row] = response.data["sales"]
+        self.assertEqual(row["total_quantity"], 6)
+        self.assertEqual(row["total_revenue"], Decimal("12.00"))
+        self.assertEqual(row["average_price"], Decimal("2.00"))
+
+    def test_rebuild_matches_incremental_rollup(self):
+        product, category = make_product(stock=20)
+        for quantity in (1, 2, 3):
+            self.sell(product, category, quantity)
+        incremental = list(DailyProductSales.objects.values_list("quantity", "revenue", "sale_count"))
+
+        DailyProductSales.objects.rebuild()
+
+        self.assertEqual(list(DailyProductSales.objects.values_list("quantity", "revenue", "sale_count")), incremental)
+
+    def test_edited_sale_moves_between_rollup_rows(self):
+        product, category = make_product(stock=20)
+        other, other_category = make_product(stock=20)
+        self.sell(product, category, 2)
+        sale = self.sell(product, category, 3)
+        # recorded yesterday; saving it again dates it today
+        Sale.objects.filter(pk=sale.pk).update(date=sale.date - timedelta(days=1))
+        DailyProductSales.objects.rebuild()
+
+        sale.refresh_from_db()
+        sale.product, sale.category, sale.quantity_sold = other, other_category, 4
+        sale.save()
+        incremental = sorted(DailyProductSales.objects.filter(sale_count__gt=0).values_list(
+            "product_id", "day", "quantity", "revenue", "sale_count"))
+
+        DailyProductSales.objects.rebuild()
+
+        self.assertEqual(sorted(DailyProductSales.objects.values_list(
+            "product_id", "day", "quantity", "revenue", "sale_count")), incremental)
+        self.assertEqual(len(incremental), 2)
+
+    def test_month_buckets(self):
+        product, category = make_product(stock=20)
+        today = timezone.localdate()
+        DailyProductSales.objects.create(
+            product=product, day=today.replace(day=1), quantity=5,
+            revenue=Decimal("10.00"), unit_price_total=Decimal("2.00"), sale_count=1,
+        )
+
+        response = self.client.get(reverse("sales"), {
+            "start": (today.replace(day=1) - timedelta(days=40)).isoformat(),
+            "end": today.isoformat(),
+            "bucket": "month",
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["period"] for row in response.data["sales"]], [today.replace(day=1)])
+
+    def test_rejects_bad_range(self):
+        response = self.client.get(reverse("sales"), {"start": "2024-02-01", "end": "2024-01-01"})
+        self.assertEqual(response.status_code, 400)
+
+
+class SalesPermissionTests(InventoryTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("seller", "seller@example.com", "pw")
+        self.group = Group.objects.create(name="Salesperson")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_anonymous_is_refused(self):
+        self.assertIn(APIClient().get(reverse("sales")).status_code, (401, 403))
+
+    def test_membership_changes_take_effect(self):
+        self.assertEqual(self.client.get(reverse("sales")).status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.group)
+        self.assertEqual(self.client.get(reverse("sales")).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.user_set.remove(self.user)
+        self.assertEqual(self.client.get(reverse("sales")).status_code, 403)
+
+    def test_steady_state_permission_check_is_query_free(self):
+        self.user.groups.add(self.group)
+        request = APIRequestFactory().get("/")
+        request.user = self.user
+        IsSalesPersonOrAdmin().has_permission(request, None)
+
+        request = APIRequestFactory().get("/")
+        request.user = self.user
+        with self.assertNumQueries(0):
+            self.assertTrue(IsSalesPersonOrAdmin().has_permission(request, None))
+
+
+class ProductSearchTests(InventoryTestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def search(self, text, **params):
+        return self.client.get(reverse("search-product"), {"searched": text, **params})
+
+    def test_ranked_prefix_search(self):
+        in_description = Product.objects.create(
+            product_name="Cable", description="Fits any keyboard", stock_quantity=1, price=Decimal("1.00")
+        )
+        in_name = Product.objects.create(product_name="Keyboard", stock_quantity=1, price=Decimal("9.00"))
+        Product.objects.create(product_name="Mouse", stock_quantity=1, price=Decimal("5.00"))
+
+        response = self.search("keyb")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual([row["id"] for row in response.data["results"]], [in_name.pk, in_description.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        product = Product.objects.create(product_name="Lamp", stock_quantity=1, price=Decimal("3.00"))
+        product.product_name = "Desk light"
+        product.save()
+        self.assertEqual(self.search("lamp").data["count"], 0)
+        self.assertEqual(self.search("desk").data["count"], 1)
+
+        product.delete()
+        self.assertEqual(self.search("desk").data["count"], 0)
+
+    def test_results_are_paginated(self):
+        for i in range(5):
+            Product.objects.create(product_name=f"Chair {i}", stock_quantity=1, price=Decimal("3.00"))
+
+        response = self.search("chair", limit=2)
+
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_thumbnail_urls_are_absolute_in_every_mode(self):
+        product = Product.objects.create(
+            product_name="Lamp", stock_quantity=1, price=Decimal("3.00"), image="products/lamp.png",
+            image_variants={"source": "products/lamp.png", "small": "thumbnails/lamp.webp"},
+        )
+        url = "http://testserver" + product.image.storage.url("thumbnails/lamp.webp")
+
+        for params in ({"searched": "lamp"}, {"searched": "lamp", "stream": 1}, {}, {"stream": 1}):
+            with self.subTest(**params):
+                response = self.client.get(reverse("search-product"), params)
+                body = response.data["results"] if not params.get("stream") else json.loads(
+                    b"".join(response.streaming_content))
+                self.assertEqual([row["thumbnails"] for row in body], [{"small": url}])
+
+
+class ResponseCacheTests(InventoryTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def test_repeat_reads_are_served_from_cache(self):
+        product, _ = make_product()
+        url = reverse("detail", args=[product.pk])
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data["product_name"], "Widget")
+
+    def test_writes_invalidate_affected_entries(self):
+        product, category = make_product(stock=10)
+        self.client.get(reverse("list"))
+        self.client.get(reverse("detail", args=[product.pk]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer = SaleSerializer(data={
+                "product": product.pk, "category": category.pk, "quantity_sold": 4, "unit_price": "2.00",
+            })
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+        self.assertEqual(self.client.get(reverse("detail", args=[product.pk])).data["stock_quantity"], 6)
+        self.assertEqual(self.client.get(reverse("list")).data["results"][0]["stock_quantity"], 6)
+
+    def test_etag_returns_not_modified(self):
+        url = reverse("list-category")
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_product()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class TokenCacheTests(InventoryTestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user("clerk", "clerk@example.com", "old-Passw0rd!")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token.key}")
+
+    def test_second_request_skips_token_lookup(self):
+        product, _ = make_product()
+        url = reverse("detail", args=[product.pk])
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(token_cache.info()["hits"], 1)
+        self.assertEqual(token_cache.info()["misses"], 1)
+
+    def test_hits_build_fresh_users_without_the_password_hash(self):
+        self.client.get(reverse("list"))
+
+        first, second = token_cache.get(self.token.key), token_cache.get(self.token.key)
+        self.assertIsNot(first.user, second.user)
+        self.assertEqual((first.user.pk, first.user.username, first.key), (self.user.pk, "clerk", self.token.key))
+        self.assertIn("password", first.user.get_deferred_fields())
+        self.assertNotIn(self.user.password, repr(token_cache.entries))
+
+    def test_last_login_update_keeps_cached_tokens(self):
+        self.client.get(reverse("list"))
+
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            user.save(update_fields=["last_login"])
+        self.assertEqual(token_cache.info()["size"], 1)
+
+    def test_deleted_token_is_rejected(self):
+        product, _ = make_product()
+        url = reverse("detail", args=[product.pk])
+        self.client.get(url)
+
+        self.token.delete()
+
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_deactivation_evicts_cached_user(self):
+        product, _ = make_product()
+        url = reverse("detail", args=[product.pk])
+        self.client.get(url)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_shared_cache_revocation_reaches_every_process(self):
+        first, second = TokenUserCache(shared_cache="default"), TokenUserCache(shared_cache="default")
+        first.set(self.token.key, self.token)
+        self.assertEqual(second.get(self.token.key).user.pk, self.user.pk)
+
+        # what forget_user_tokens() does on a password change, in the first process
+        first.delete_user(self.user.pk)
+        first.delete(self.token.key)
+
+        self.assertIsNone(second.get(self.token.key))
+        self.assertIsNone(first.get(self.token.key))
+
+
+@override_settings(INVENTORY_PASSWORD_HASHING={"PBKDF2_ITERATIONS": 1000, "SCRYPT_WORK_FACTOR": 2 ** 10})
+class PasswordHashingTests(InventoryTestCase):
+    def signup(self, username="clerk", password="s3cret-Passw0rd"):
+        return self.client.post(reverse("signup"), {
+            "username": username, "password": password, "first_name": "Sam", "last_name": "Clerk",
+        })
+
+    def login(self, username="clerk", password="s3cret-Passw0rd"):
+        return self.client.post(reverse("login"), {"username": username, "password": password})
+
+    def test_signup_hashes_once(self):
+        with mock.patch.object(PBKDF2PasswordHasher, "encode", autospec=True,
+                               side_effect=PBKDF2PasswordHasher.encode) as encode:
+            response = self.signup()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(encode.call_count, 1)
+        self.assertNotIn("password", response.data["user"])
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_login_does_not_return_password(self):
+        self.signup()
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("password", response.data["user"])
+
+    def test_wrong_password_unknown_and_inactive_users_are_rejected(self):
+        self.signup()
+        self.assertEqual(self.login(password="wrong").status_code, 401)
+        self.assertEqual(self.login(username="nobody").status_code, 401)
+        User.objects.filter(username="clerk").update(is_active=False)
+        self.assertEqual(self.login().status_code, 401)
+
+    def test_login_upgrades_outdated_hash(self):
+        self.signup()
+        with override_settings(INVENTORY_PASSWORD_HASHING={"PBKDF2_ITERATIONS": 2000}):
+            self.assertEqual(self.login().status_code, 200)
+        self.assertTrue(User.objects.get(username="clerk").password.startswith("pbkdf2_sha256$2000$"))
+
+        with override_settings(PASSWORD_HASHERS=hasher_list("scrypt")):
+            self.assertEqual(self.login().status_code, 200)
+            self.assertTrue(User.objects.get(username="clerk").password.startswith("scrypt$"))
+            self.assertEqual(self.login().status_code, 200)
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        memory_buckets.clear()
+
+    def test_bucket_refills_over_time(self):
+        buckets = MemoryBuckets()
+        now = [1000.0]
+        buckets.clock = lambda: now[0]
+
+        self.assertEqual([buckets.take("k", 3, 60) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(buckets.take("k", 3, 60), 20)
+        now[0] += 20
+        self.assertEqual(buckets.take("k", 3, 60), 0)
+        self.assertEqual(buckets.take("other", 3, 60), 0)
+
+    @override_settings(INVENTORY_THROTTLING={"RATES": {"login": "2/min"}})
+    def test_route_budget_returns_retry_after(self):
+        credentials = {"username": "nobody", "password": "wrong"}
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse("login"), credentials).status_code, 401)
+
+        response = self.client.post(reverse("login"), credentials)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+        # other routes have their own budget, or none
+        self.assertEqual(self.client.post(reverse("signup"), {}).status_code, 400)
+
+    def test_budgets_are_per_user(self):
+        product, category = make_product(stock=10)
+        row = {"product": product.pk, "category": category.pk, "quantity_sold": 1, "unit_price": "2.00"}
+        clients = []
+        for name in ("first", "second"):
+            client = APIClient()
+            client.force_authenticate(User.objects.create_superuser(name, f"{name}@example.com", "pw"))
+            clients.append(client)
+
+        for shared_cache in (None, "default"):
+            memory_buckets.clear()
+            cache.clear()
+            options = {"SHARED_CACHE": shared_cache, "RATES": {"create-sale": "1/hour"}}
+            with self.subTest(shared_cache=shared_cache), override_settings(INVENTORY_THROTTLING=options):
+                self.assertEqual(clients[0].post(reverse("create-sale"), row).status_code, 201)
+                self.assertEqual(clients[0].post(reverse("create-sale"), row).status_code, 429)
+                self.assertEqual(clients[1].post(reverse("create-sale"), row).status_code, 201)
+
+    @override_settings(INVENTORY_THROTTLING={"RATES": {"create-sale": "5/min"}})
+    def test_token_clients_are_keyed_by_user(self):
+        product, category = make_product(stock=10)
+        user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token.key}")
+        row = {"product": product.pk, "category": category.pk, "quantity_sold": 1, "unit_price": "2.00"}
+
+        self.assertEqual(client.post(reverse("create-sale"), row).status_code, 201)
+        self.assertEqual(list(memory_buckets.full_at), [f"create-sale:user:{user.pk}"])
+
+    @override_settings(INVENTORY_THROTTLING={"ENABLED": False, "RATES": {"login": "1/min"}})
+    def test_disabled(self):
+        for _ in range(3):
+            self.assertEqual(self.client.post(reverse("login"), {"username": "a", "password": "b"}).status_code, 401)
+
+
+class AsyncReadViewTests(InventoryTestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.headers = {"Authorization": f"Bearer {Token.objects.create(user=self.admin).key}"}
+
+    async def test_list_pages_with_cursor(self):
+        for i in range(3):
+            await Product.objects.acreate(product_name=f"Stool {i}", stock_quantity=1, price=Decimal("4.00"))
+
+        first = await self.async_client.get(reverse("async-list"), {"page_size": 2}, headers=self.headers)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([row["product_name"] for row in first.json()["results"]], ["Stool 2", "Stool 1"])
+
+        second = await self.async_client.get(first.json()["next"], headers=self.headers)
+        self.assertEqual([row["product_name"] for row in second.json()["results"]], ["Stool 0"])
+        self.assertIsNone(second.json()["next"])
+        self.assertIsNotNone(second.json()["previous"])
+
+    async def test_list_and_search_match_sync_views(self):
+        for i in range(3):
+            await Product.objects.acreate(product_name=f"Stool {i}", stock_quantity=1, price=Decimal("4.00"))
+
+        for async_route, sync_route, params in [
+            ("async-list", "list", {"page_size": 2}),
+            ("async-search-product", "search-product", {"searched": "stool", "limit": 2}),
+        ]:
+            async_response = await self.async_client.get(reverse(async_route), params, headers=self.headers)
+            sync_response = await sync_to_async(self.client.get)(reverse(sync_route), params, headers=self.headers)
+            self.assertEqual(async_response.json().keys(), sync_response.json().keys())
+            self.assertEqual(async_response.json()["results"], sync_response.json()["results"])
+
+    async def test_cached_responses_answer_if_none_match(self):
+        product = await Product.objects.acreate(product_name="Stool", stock_quantity=1, price=Decimal("4.00"))
+        url = reverse("async-detail", args=[product.pk])
+
+        first = await self.async_client.get(url, headers=self.headers)
+        again = await self.async_client.get(url, headers={**self.headers, "If-None-Match": first["ETag"]})
+        self.assertEqual(again.status_code, 304)
+
+    async def test_detail_matches_sync_view(self):
+        product = await Product.objects.acreate(product_name="Stool", stock_quantity=1, price=Decimal("4.00"))
+
+        async_response = await self.async_client.get(reverse("async-detail", args=[product.pk]), headers=self.headers)
+        sync_response = await sync_to_async(self.client.get)(reverse("detail", args=[product.pk]), headers=self.headers)
+
+        self.assertEqual(async_response.json(), sync_response.json())
+        missing = await self.async_client.get(reverse("async-detail", args=[product.pk + 1]), headers=self.headers)
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_search_and_analytics(self):
+        await Product.objects.acreate(product_name="Bar stool", stock_quantity=1, price=Decimal("4.00"))
+
+        response = await self.async_client.get(reverse("async-search-product"), {"searched": "sto"})
+        self.assertEqual(response.json()["count"], 1)
+
+        response = await self.async_client.get(reverse("async-sales"), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["sales"], [])
+
+    async def test_requires_credentials(self):
+        response = await self.async_client.get(reverse("async-list"))
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(INVENTORY_METRICS={"SAMPLE_RATE": 1.0})
+class MetricsTests(InventoryTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_authenticate(self.admin)
+
+    def test_server_timing_and_prometheus_exposition(self):
+        make_product()
+
+        response = self.client.get(reverse("list"))
+
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="[1-9]\d* queries", serializer;dur=[\d.]+, total;dur=')
+        self.assertNotRegex(response["Server-Timing"], r"serializer;dur=0\.00,")
+        self.client.force_login(self.admin)
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('inventory_requests_total{route="list",method="GET",status="200"}', body)
+        self.assertIn('inventory_request_db_queries_bucket{route="list",le="+Inf"}', body)
+        self.assertIn('inventory_response_size_bytes_count{route="list"}', body)
+        self.assertIn("inventory_token_cache_hits_total ", body)
+
+    def test_metrics_require_staff_or_token(self):
+        self.assertEqual(APIClient().get("/metrics").status_code, 403)
+        with override_settings(INVENTORY_METRICS={"SAMPLE_RATE": 1.0, "AUTH_TOKEN": "secret"}):
+            self.assertEqual(APIClient().get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+            self.assertEqual(APIClient().get("/metrics", HTTP_AUTHORIZATION="Bearer guess").status_code, 403)
+            self.assertEqual(APIClient().get("/metrics").status_code, 403)
+
+
+class QueryDetectorTests(InventoryTestCase):
+    def test_fingerprint_folds_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 7 AND name = 'a''b' AND x IN (%s, %s, %s)"),
+            fingerprint("SELECT *  FROM t WHERE id = 12 AND name = 'c' AND x IN (%s)"),
+        )
+
+    def test_repeated_query_reports_serializer_method(self):
+        for _ in range(3):
+            make_product()
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with query_budget():
+                CategorySerializer(Category.objects.select_related("product"), many=True).data
+        self.assertIn("repeated 3x from CategorySerializer.get_sales_count", str(raised.exception))
+
+        with query_budget(1):
+            CategorySerializer(
+                Category.objects.select_related("product").with_sales_count(), many=True
+            ).data
+
+    def test_lazy_objects_on_the_stack_are_not_evaluated(self):
+        user = User.objects.create_user("lazy")
+        lazy_user = SimpleLazyObject(lambda: User.objects.get(pk=user.pk))
+        with detecting() as report:
+            self.assertEqual(lazy_user.username, "lazy")
+        self.assertEqual(len(report), 1)
+
+    def test_bulk_sale_updates_per_product_are_not_repeats(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        rows = []
+        for _ in range(3):
+            product, category = make_product(stock=5)
+            rows.append({"product": product.pk, "category": category.pk, "quantity_sold": 1, "unit_price": "2.00"})
+
+        with query_budget(40) as report:
+            response = client.post(reverse("bulk-create-sale"), rows, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        # repeated per product, but marked as expected so the budget passes
+        self.assertTrue(report.expected)
+
+    def test_budget_counts_queries_inside_requests(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        make_product()
+        with self.assertRaisesMessage(QueryBudgetExceeded, "query budget of 0 exceeded"):
+            with query_budget(0):
+                client.get(reverse("list-category"))
+
+
+class BenchmarkTests(InventoryTestCase):
+    def test_seed_spreads_categories_over_products(self):
+        created = seed(products=3, categories=7, sales=20, rebuild=False)
+        self.assertEqual(created, {"products": 3, "categories": 7, "sales": 20})
+        self.assertEqual(Category.objects.filter(product__isnull=False).count(), 7)
+        self.assertFalse(Sale.objects.exclude(category__product=F("product")).exists())
+
+    def test_in_process_run_reports_every_route(self):
+        seed(products=5, sales=50, random_seed=1)
+        user = User.objects.create_superuser("bench", "bench@example.com", "pw")
+        token = Token.objects.create(user=user)
+        report = run_in_process(list(WORKLOADS), Dataset(random_seed=1), 2, token)
+
+        self.assertEqual(set(report), set(WORKLOADS))
+        for name, stats in report.items():
+            with self.subTest(route=name):
+                self.assertEqual((stats["requests"], stats["errors"]), (2, 0))
+                self.assertIsNotNone(stats["p99_ms"])
+                self.assertIsNotNone(stats["queries_per_request"])
+
+
+def png_upload(name="photo.png", size=(800, 600), color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ProductImageTests(InventoryTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root,
+            INVENTORY_IMAGES={"THUMBNAIL_SIZES": {"small": (160, 160)}, "SYNC": True},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def create_product(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("create"), {
+                "product_name": "Lamp", "stock_quantity": 5, "price": "9.99", "image": upload,
+            }, format="multipart")
+        self.assertEqual(response.status_code, 201, response.data)
+        return Product.objects.get(pk=response.data["id"])
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.create_product(png_upload("a.png"))
+        second = self.create_product(png_upload("b.png"))
+        other = self.create_product(png_upload("c.png", color="blue"))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertEqual(first.image_variants, second.image_variants)
+
+    def test_thumbnails_are_rendered_and_listed(self):
+        product = self.create_product(png_upload())
+        with product.image.storage.open(product.image_variants["small"]) as thumbnail:
+            self.assertLessEqual(max(Image.open(thumbnail).size), 160)
+
+        response = self.client.get(reverse("detail", args=[product.pk]))
+        self.assertTrue(response.data["thumbnails"]["small"].endswith(".webp"))
+
+    def test_thumbnails_are_queued_for_the_worker(self):
+        with override_settings(INVENTORY_IMAGES={"THUMBNAIL_SIZES": {"small": (160, 160)}}):
+            product = self.create_product(png_upload())
+        self.assertEqual(product.image_variants, {})
+        self.assertEqual(list(Task.objects.values_list("name", "payload")),
+                         [("products.thumbnails", {"name": product.image.name})])
+
+        self.assertEqual(tasks.run_pending(), 1)
+
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants["source"], product.image.name)
+
+
+class TaskQueueTests(InventoryTestCase):
+    def sell(self, product, category, quantity=1):
+        serializer = SaleSerializer(data={
+            "product": product.pk, "category": category.pk, "quantity_sold": quantity, "unit_price": "2.00",
+        })
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def register(self, name, handler, max_attempts=5):
+        tasks.task(name, max_attempts)(handler)
+        self.addCleanup(tasks.REGISTRY.pop, name)
+
+    @override_settings(INVENTORY_TASKS={"DEFERRED_SALE_EFFECTS": ["rollup", "cache"]})
+    def test_deferred_rollup_is_applied_by_the_worker(self):
+        product, category = make_product(stock=10)
+        for quantity in (1, 2, 3):
+            self.sell(product, category, quantity)
+        self.assertFalse(DailyProductSales.objects.exists())
+        self.assertEqual(Task.objects.count(), 6)
+
+        self.assertEqual(tasks.run_pending(), 6)
+        rollup = DailyProductSales.objects.get()
+        self.assertEqual((rollup.quantity, rollup.sale_count, rollup.revenue), (6, 3, Decimal("12.00")))
+        self.assertFalse(Task.objects.exists())
+
+    def test_failures_back_off_then_fail(self):
+        def explode(payloads):
+            raise RuntimeError("boom")
+        self.register("test.explode", explode, max_attempts=2)
+        tasks.enqueue("test.explode", {})
+
+        with self.assertLogs("inventory.tasks", "ERROR"):
+            tasks.run_pending()
+        row = Task.objects.get()
+        self.assertEqual((row.status, row.attempts), (Task.PENDING, 1))
+        self.assertGreater(row.run_after, timezone.now())
+        self.assertIn("boom", row.last_error)
+
+        Task.objects.update(run_after=timezone.now())
+        with self.assertLogs("inventory.tasks", "ERROR") as logs:
+            tasks.run_pending()
+        self.assertIn("failed for good", logs.output[-1])
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def test_bad_payload_does_not_hold_back_its_batch(self):
+        seen = []
+
+        def record(payloads):
+            if any(payload.get("bad") for payload in payloads):
+                raise ValueError("bad payload")
+            seen.extend(payload["n"] for payload in payloads)
+        self.register("test.record", record)
+        tasks.enqueue("test.record", {"n": 1}, {"n": 2, "bad": True}, {"n": 3})
+
+        with self.assertLogs("inventory.tasks", "ERROR"):
+            self.assertEqual(tasks.run_pending(), 3)
+        self.assertEqual(sorted(seen), [1, 3])
+        self.assertEqual(list(Task.objects.values_list("status", flat=True)), [Task.PENDING])
+
+
+class LowStockAlertTests(InventoryTestCase):
+    def setUp(self):
+        self.product, self.category = make_product(stock=12)
+        Product.objects.filter(pk=self.product.pk).update(reorder_threshold=10)
+
+    def sell(self, quantity):
+        serializer = SaleSerializer(data={
+            "product": self.product.pk, "category": self.category.pk,
+            "quantity_sold": quantity, "unit_price": "2.00",
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    def test_alert_opens_once_and_resolves_with_hysteresis(self):
+        self.sell(2)
+        self.sell(1)
+        alert = Alert.objects.get()
+        self.assertEqual((alert.status, alert.stock_quantity, alert.threshold), (Alert.OPEN, 10, 10))
+
+        # stock is 9; it resolves at 10 + 20%, not just above the threshold
+        self.product.update_quantity(2)
+        self.assertEqual(Alert.objects.get().status, Alert.OPEN)
+        self.product.update_quantity(1)
+        self.assertEqual(Alert.objects.get().status, Alert.RESOLVED)
+
+        self.sell(3)
+        self.assertEqual(Alert.objects.open().count(), 1)
+        self.assertEqual(Alert.objects.count(), 2)
+
+    def test_evaluation_cost_does_not_depend_on_catalog_size(self):
+        for _ in range(30):
+            make_product(stock=1)
+        Product.objects.update(reorder_threshold=5)
+        touched = [self.product.pk, Product.objects.last().pk]
+        with self.assertNumQueries(3):
+            Alert.objects.evaluate(touched)
+
+    def test_bulk_sales_evaluate_touched_products(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        row = {"product": self.product.pk, "category": self.category.pk, "quantity_sold": 1, "unit_price": "2.00"}
+        client.post(reverse("bulk-create-sale"), [row, row], format="json")
+
+        response = client.get(reverse("alerts"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([alert["product_name"] for alert in response.data["results"]], ["Widget"])
+        self.assertEqual(client.get(reverse("alerts"), {"status": "resolved"}).data["results"], [])
+
+
+class ExportTests(InventoryTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        self.product, category = make_product(stock=20)
+        other, other_category = make_product(stock=20)
+        self.sales = [
+            Sale.objects.create(product=self.product, category=category, quantity_sold=n, unit_price=Decimal("2.50"))
+            for n in (1, 2, 3)
+        ]
+        Sale.objects.create(product=other, category=other_category, quantity_sold=1, unit_price=other.price)
+
+    def test_csv_export_streams_filtered_rows(self):
+        response = self.client.get(reverse("export-sales"), {"product": self.product.pk})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ["id", "product", "product_name", "category", "date",
+                                   "quantity_sold", "unit_price", "total_sale"])
+        self.assertEqual([row[0] for row in rows[1:]], [str(sale.pk) for sale in self.sales])
+        self.assertEqual(rows[3][5:], ["3", "2.50", "7.50"])
+        self.assertEqual(rows[1][4], self.sales[0].date.isoformat())
+
+        yesterday = timezone.localdate() - timedelta(days=1)
+        response = self.client.get(reverse("export-sales"), {"end": yesterday})
+        self.assertEqual(b"".join(response.streaming_content).decode().count("\n"), 1)
+
+    def test_gzipped_ndjson_export(self):
+        with override_settings(INVENTORY_EXPORT={"CHUNK_SIZE": 1}):
+            response = self.client.get(reverse("export-products"), {"output": "ndjson"}, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        lines = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        products = [json.loads(line) for line in lines]
+        self.assertEqual(len(products), 2)
+        self.assertEqual(products[0]["id"], self.product.pk)
+        self.assertEqual(products[0]["price"], "2.00")
+        self.assertEqual(products[0]["stock_quantity"], 20)
+
+    def test_rejects_bad_parameters_and_non_admins(self):
+        self.assertEqual(self.client.get(reverse("export-sales"), {"output": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("export-sales"), {"start": "soon"}).status_code, 400)
+        clerk = APIClient()
+        clerk.force_authenticate(User.objects.create_user("clerk"))
+        self.assertEqual(clerk.get(reverse("export-sales")).status_code, 403)
+
+    def test_command_matches_endpoint(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = f"{directory}/sales.csv.gz"
+
+        call_command("export_data", "sales", output=path, stderr=io.StringIO())
+
+        with gzip.open(path) as exported:
+            self.assertEqual(exported.read(), b"".join(self.client.get(reverse("export-sales")).streaming_content))
+
+
+class CatalogImportTests(InventoryTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        self.existing = Product.objects.create(
+            sku="A-1", product_name="Widget", stock_quantity=10, price=Decimal("2.00"), reorder_threshold=3,
+        )
+
+    def post(self, body, content_type):
+        return self.client.post(reverse("import-products"), body, content_type=content_type)
+
+    def test_csv_creates_updates_and_reports_row_errors(self):
+        body = "\n".join([
+            "sku,product_name,price,stock_quantity",
+            "A-1,Widget v2,2.50,",
+            "B-2,Gizmo,9.99,4",
+            "C-3,Broken,0,4",
+            "D-4,,1.00,1",
+            "E-5,Thing,1.00,1,extra",
+        ])
+
+        response = self.post(body, "text/csv")
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data["created"], response.data["updated"], response.data["failed"]), (1, 1, 3))
+        self.assertEqual([error["index"] for error in response.data["errors"]], [2, 3, 4])
+        self.assertEqual(response.data["errors"][0]["errors"], {"price": ["Price must be greater than zero"]})
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.product_name, self.existing.price, self.existing.stock_quantity),
+                         ("Widget v2", Decimal("2.50"), 10))
+        gizmo = Product.objects.get(sku="B-2")
+        self.assertEqual((gizmo.price, gizmo.stock_quantity, gizmo.units_sold), (Decimal("9.99"), 4, 0))
+        self.assertEqual(list(gizmo.stock_movements.values_list("quantity", flat=True)), [4])
+        # bulk writes skip signals; the import refreshes the search index itself
+        found = self.client.get(reverse("search-product"), {"searched": "gizmo"}).data["results"]
+        self.assertEqual([product["id"] for product in found], [gizmo.pk])
+
+    def test_json_array_updates_only_given_columns(self):
+        body = json.dumps([{"sku": "A-1", "stock_quantity": 2}, {"sku": "Z-9", "product_name": "New"}])
+
+        # tiny reads split elements across chunks
+        with mock.patch("inventory.catalog.READ_SIZE", 7):
+            response = self.post(body, "application/json")
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data["errors"], [{"index": 1, "errors": {"price": ["Required for new products."]}}])
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.product_name, self.existing.stock_quantity), ("Widget", 2))
+        self.assertTrue(Alert.objects.open().filter(product=self.existing).exists())
+
+        self.assertEqual(self.post('[{"sku": "A-1", "price": 3}', "application/json").status_code, 400)
+
+    def test_ndjson_repeated_sku_keeps_last_row(self):
+        rows = [
+            {"sku": "N-1", "product_name": "First", "price": 1.5},
+            {"sku": "N-1", "product_name": "Second", "price": 2.25},
+        ]
+        body = "\n".join([json.dumps(row) for row in rows] + ["{not json"])
+
+        response = self.post(body, "application/x-ndjson")
+
+        self.assertEqual((response.data["created"], response.data["updated"], response.data["failed"]), (1, 1, 1))
+        product = Product.objects.get(sku="N-1")
+        self.assertEqual((product.product_name, product.price), ("Second", Decimal("2.25")))
+
+    def test_queries_per_batch_do_not_grow_with_rows(self):
+        def import_rows(count, offset):
+            rows = [f"S-{offset + n},Part {n},1.00,5" for n in range(count)]
+            body = "\n".join(["sku,product_name,price,stock_quantity"] + rows)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post(body, "text/csv").status_code, 200)
+            return len(queries)
+
+        self.assertEqual(import_rows(5, 0), import_rows(50, 100))
+
+    def test_command_reads_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = f"{directory}/catalog.csv"
+        with open(path, "w") as handle:
+            handle.write("sku,product_name,price\nA-1,Renamed,2.00\nF-6,Fresh,4.00\n")
+        out = io.StringIO()
+
+        call_command("import_products", path, "--batch-size", "1", stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual((report["created"], report["updated"], report["failed"]), (1, 1, 0))
+        self.assertEqual(Product.objects.get(sku="A-1").product_name, "Renamed")
+
+
+class StockLedgerTests(InventoryTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        self.product, self.category = make_product(stock=10)
+
+    def sale(self, quantity):
+        return {"product": self.product.pk, "category": self.category.pk, "quantity_sold": quantity, "unit_price": "2.00"}
+
+    def test_every_stock_change_is_a_movement(self):
+        self.client.post(reverse("create-sale"), self.sale(3), format="json")
+        self.client.post(reverse("bulk-create-sale"), [self.sale(1), self.sale(2)], format="json")
+        self.product.update_quantity(5, kind=StockMovement.RESTOCK, note="Delivery")
+        self.client.patch(reverse("update-product", args=[self.product.pk]), {"stock_quantity": 20}, format="json")
+
+        movements = list(self.product.stock_movements.order_by("pk").values_list("kind", "quantity"))
+        self.assertEqual(movements, [
+            ("adjustment", 10), ("sale", -3), ("sale", -1), ("sale", -2), ("restock", 5), ("restock", 11),
+        ])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 20)
+        self.assertEqual(sum(quantity for _, quantity in movements), 20)
+        self.assertEqual(Sale.objects.filter(stock_movements__isnull=False).count(), 3)
+
+    def test_stock_at_reads_latest_snapshot_plus_later_movements(self):
+        start = timezone.now()
+        StockMovement.objects.create(product=self.product, kind="sale", quantity=-3, created_at=start + timedelta(hours=1))
+        StockMovement.objects.create(product=self.product, kind="restock", quantity=5, created_at=start + timedelta(hours=2))
+
+        self.assertEqual(StockSnapshot.objects.take(start + timedelta(minutes=90)), 1)
+        self.assertEqual(StockSnapshot.objects.get().stock_quantity, 7)
+        # nothing moved since, and an older time is never snapshotted again
+        self.assertEqual(StockSnapshot.objects.take(start + timedelta(minutes=80)), 0)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.product.quantity_left(start + timedelta(hours=3)), 12)
+        self.assertEqual(self.product.quantity_left(start + timedelta(minutes=90)), 7)
+        self.assertEqual(self.product.quantity_left(start + timedelta(minutes=30)), 10)
+        self.assertIsNone(self.product.quantity_left(start - timedelta(days=1)))
+        self.assertEqual(self.product.quantity_left(), 10)
+
+    def test_deleted_sale_returns_its_units(self):
+        response = self.client.post(reverse("create-sale"), self.sale(4), format="json")
+        Sale.objects.get(pk=response.data["id"]).delete()
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock_quantity, self.product.units_sold), (10, 0))
+        self.assertEqual(self.product.stock_movements.latest("pk").kind, StockMovement.RETURN)
+        self.assertEqual(sum(self.product.stock_movements.values_list("quantity", flat=True)), 10)
+
+    def test_remaining_stock_agrees_with_the_ledger(self):
+        self.client.post(reverse("create-sale"), self.sale(3), format="json")
+        self.client.post(reverse("bulk-create-sale"), [self.sale(2)], format="json")
+
+        data = self.client.get(reverse("detail", args=[self.product.pk]), {"as_of": timezone.now().isoformat()}).data
+        self.assertEqual(data["remaining_stock"], 5)
+        self.assertEqual(data["stock_as_of"]["stock_quantity"], data["remaining_stock"])
+
+    def test_movements_cannot_be_edited(self):
+        movement = self.product.stock_movements.get()
+        movement.quantity = 99
+        with self.assertRaises(ValueError):
+            movement.save()
+
+    def test_detail_as_of(self):
+        url = reverse("detail", args=[self.product.pk])
+        self.product.update_quantity(-4)
+        today = timezone.localdate()
+
+        response = self.client.get(url, {"as_of": today.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["stock_as_of"]["stock_quantity"], 6)
+        yesterday = (today - timedelta(days=1)).isoformat()
+        self.assertIsNone(self.client.get(url, {"as_of": yesterday}).data["stock_as_of"]["stock_quantity"])
+        self.assertNotIn("stock_as_of", self.client.get(url).data)
+        self.assertEqual(self.client.get(url, {"as_of": "last tuesday"}).status_code, 400)
+
+    def test_snapshot_command(self):
+        out = io.StringIO()
+        call_command("snapshot_stock", "--at", (timezone.now() + timedelta(seconds=1)).isoformat(), stdout=out)
+        self.assertIn("Wrote 1 stock snapshots", out.getvalue())
+        self.assertEqual(StockSnapshot.objects.get(product=self.product).stock_quantity, 10)
+
+
+class QueryCountRegressionTests(InventoryTestCase):
+    """
+    Every list endpoint must issue the same number of queries however many
+    rows it returns; a per-row query shows up as a difference.
+    """
+    list_routes = [
+        ("list", {}),
+        ("list-category", {}),
+        ("list-sale", {}),
+        ("search-product", {}),
+        ("search-product", {"searched": "widget"}),
+        ("sales", {}),
+    ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def add_rows(self, count):
+        for _ in range(count):
+            product, category = make_product(stock=10)
+            Sale.objects.create(product=product, category=category, quantity_sold=1, unit_price=product.price)
+
+    def query_counts(self):
+        counts = {}
+        for route, params in self.list_routes:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(route), params)
+            self.assertEqual(response.status_code, 200, route)
+            counts[(route, tuple(params.items()))] = len(queries)
+        return counts
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_rows(2)
+        few = self.query_counts()
+        self.add_rows(10)
+        many = self.query_counts()
+
+        for endpoint, count in few.items():
+            with self.subTest(endpoint=endpoint):
+                self.assertEqual(many[endpoint], count)
+
+
+@without_throttling
+class SaleConcurrencyTests(TransactionTestCase):
+    threads = 16
+    attempts_per_thread = 25
+
+    def test_concurrent_sales_never_oversell(self):
+        stock = 200
+        product, category = make_product(stock=stock)
+        sold = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                for _ in range(self.attempts_per_thread):
+                    serializer = SaleSerializer(data={
+                        "product": product.pk,
+                        "category": category.pk,
+                        "quantity_sold": 1,
+                        "unit_price": "2.00",
+                    })
+                    if not serializer.is_valid():
+                        continue
+                    try:
+                        serializer.save()
+                    except serializers.ValidationError:
+                        continue
+                    with lock:
+                        sold.append(1)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(len(sold), stock)
+        self.assertEqual(product.stock_quantity, 0)
+        self.assertEqual(product.units_sold, stock)
+        self.assertEqual(Sale.objects.count(), stock)
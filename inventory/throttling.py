@@ -0,0 +1,134 @@
+"""
+Per-route rate limiting plugged into DRF's throttle hooks.
+
+RouteThrottle looks up the budget for the request's URL name in
+INVENTORY_THROTTLING['RATES'] ("10/min" allows bursts of 10 and refills
+one request every 6 seconds); routes without a budget are not limited.
+Clients are told when to come back with a Retry-After header, which DRF
+adds from wait().
+
+The buckets use the generic cell rate algorithm: each (route, client)
+keeps only the time at which its bucket will be full again, so taking a
+token is one read and one write of a float. In-process buckets do that
+on a dict without a lock; two threads racing on the same key can lose an
+update, letting one extra request through, which is fine for a rate
+limit. Set SHARED_CACHE to a CACHES alias to share buckets between
+processes (the same race applies across processes).
+"""
+import math
+import time
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def get_options():
+    return getattr(settings, "INVENTORY_THROTTLING", {})
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60)"""
+    count, period = rate.split("/")
+    return int(count), PERIODS[period[0]]
+
+
+class Buckets(ABC):
+    clock = staticmethod(time.monotonic)
+
+    def take(self, key, count, period):
+        """Take one token from `key`'s bucket; returns 0 or the seconds until one is available"""
+        now = self.clock()
+        interval = period / count
+        full_at = max(self.get(key, now), now)
+        # the bucket holds `count` tokens, i.e. `period` seconds of refill;
+        # the last one may be taken while `period - interval` are missing
+        overdrawn = (full_at - now) - (period - interval)
+        if overdrawn > 0:
+            return overdrawn
+        self.set(key, full_at + interval, period, now)
+        return 0
+
+    @abstractmethod
+    def get(self, key, default):
+        """The time `key`'s bucket is full again, or default for an unknown key"""
+
+    @abstractmethod
+    def set(self, key, full_at, period, now):
+        """Store full_at for `key`; it can be forgotten once `now` passes it"""
+
+
+class MemoryBuckets(Buckets):
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.full_at = {}
+
+    def get(self, key, default):
+        return self.full_at.get(key, default)
+
+    def set(self, key, full_at, period, now):
+        self.full_at[key] = full_at
+        if len(self.full_at) > self.max_keys:
+            self.prune(now)
+
+    def prune(self, now):
+        # buckets that have refilled are the same as absent ones
+        for key, full_at in list(self.full_at.items()):
+            if full_at <= now:
+                self.full_at.pop(key, None)
+        if len(self.full_at) > self.max_keys:
+            # fail open rather than grow without bound
+            self.full_at.clear()
+
+    def clear(self):
+        self.full_at.clear()
+
+
+class CacheBuckets(Buckets):
+    # shared between processes, so wall-clock time
+    clock = staticmethod(time.time)
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def get(self, key, default):
+        return self.cache.get(f"inventory:throttle:{key}", default)
+
+    def set(self, key, full_at, period, now):
+        self.cache.set(f"inventory:throttle:{key}", full_at, math.ceil(full_at - now) + 1)
+
+
+memory_buckets = MemoryBuckets(get_options().get("MAX_KEYS", 100000))
+
+
+def get_buckets():
+    alias = get_options().get("SHARED_CACHE")
+    return CacheBuckets(alias) if alias else memory_buckets
+
+
+class RouteThrottle(BaseThrottle):
+    """Token bucket per URL name and client (user, else IP address)"""
+
+    wait_seconds = None
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{super().get_ident(request)}"
+
+    def allow_request(self, request, view):
+        options = get_options()
+        match = request.resolver_match
+        rate = options.get("RATES", {}).get(match.url_name if match else None)
+        if not rate or not options.get("ENABLED", True):
+            return True
+        count, period = parse_rate(rate)
+        self.wait_seconds = get_buckets().take(f"{match.url_name}:{self.get_ident(request)}", count, period)
+        return not self.wait_seconds
+
+    def wait(self):
+        # DRF truncates Retry-After to whole seconds
+        return math.ceil(self.wait_seconds) if self.wait_seconds else None
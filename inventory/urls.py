@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path("signup/", views.signup, name="signup"),  
@@ -7,6 +7,7 @@ urlpatterns = [
     path("",views.ProductListView.as_view(), name="list"),   
     path("<int:pk>/",views.ProductDetailView.as_view(), name="detail"),
     path("create-product/",views.ProductCreateView.as_view(), name="create"),
+    path("import-products/",views.ProductImportView.as_view(), name="import-products"),
     path("change-password/",views.ChangePasswordView.as_view(), name="change-password"),
     path("<int:pk>/update-product/",views.ProductUpdateView.as_view(), name="update-product"),
     path("<int:pk>/delete-product/",views.ProductDeleteView.as_view(), name="delete-product"),
@@ -17,7 +18,15 @@ urlpatterns = [
     path("<int:pk>/delete-category/",views.CategoryDeleteView.as_view(), name="delete-category"),
     path("list-sale/",views.SalesListView.as_view(), name="list-sale"),
     path("create-sale/",views.SalesCreateView.as_view(), name="create-sale"),
+    path("create-sale/bulk/",views.SalesBulkCreateView.as_view(), name="bulk-create-sale"),
     path("<int:pk>/delete-sale/",views.SalesDeleteView.as_view(), name="delete-sale"),
+    path("alerts/",views.AlertListView.as_view(), name="alerts"),
+    path("export/sales/",views.ExportView.as_view(kind="sales"), name="export-sales"),
+    path("export/products/",views.ExportView.as_view(kind="products"), name="export-products"),
+    path("async/",async_views.AsyncProductListView.as_view(), name="async-list"),
+    path("async/<int:pk>/",async_views.AsyncProductDetailView.as_view(), name="async-detail"),
+    path("async/search-product/",async_views.AsyncSearchView.as_view(), name="async-search-product"),
+    path("async/sales/",async_views.AsyncSalesAnalyticsView.as_view(), name="async-sales"),
     
     
 ]
\ No newline at end of file
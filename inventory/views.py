@@ -1,18 +1,45 @@
+import os
+import re
+
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes,authentication_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.authtoken.models import Token
+from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from rest_framework import status,generics
 from .serializers import *
+from .models import Alert, DailyProductSales, day_start
 from rest_framework.views import APIView
 from django.shortcuts import render, get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
-from django.db.models import Sum,Avg,Q
+from django.db.models import Sum,Q,F
+from django.db.models.functions import TruncMonth, TruncWeek
+from datetime import date, datetime, timedelta
+from rest_framework.exceptions import ValidationError
+from decimal import Decimal
 from rest_framework import permissions,authentication
 from .permissions import IsSalesPersonOrAdmin
-from .authentication import TokenAuthentication
+from .authentication import CachedTokenAuthentication
+from .parsers import NDJSONParser
+from .search import search_products
+from .cache import CachedResponseMixin
+from rest_framework.parsers import JSONParser
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from .export import CONTENT_TYPES, export_chunks, gzip_chunks, parse_filters
+from .catalog import import_products
+from .pagination import (
+    AlertCursorPagination,
+    ProductCursorPagination,
+    SaleCursorPagination,
+    CategoryCursorPagination,
+    SearchPagination,
+    StreamingListMixin,
+    stream_json,
+    wants_stream,
+)
 
 
 @permission_classes([IsAuthenticated])
@@ -25,8 +52,10 @@ def login(request):
     if not username or not password:
         return Response({"error": "Username and password are required."}, status=status.HTTP_400_BAD_REQUEST)
 
-    user = User.objects.filter(username=username).first()  
-    if not user or not user.check_password(password):  
+    # authenticate() hashes once for unknown usernames too, so response time
+    # doesn't reveal which exist, and re-hashes outdated stored passwords
+    user = authenticate(request, username=username, password=password)
+    if user is None:
         return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
     
     token, created = Token.objects.get_or_create(user=user)
@@ -59,10 +88,9 @@ def signup(request):
         # Validate and create user
         serializer = UserSerializer(data=data)
         if serializer.is_valid():
+            # UserSerializer.create hashes the password through create_user
             user = serializer.save()
-            user.set_password(data["password"])
-            user.save()
-            
+
             # Create auth token
             token = Token.objects.create(user=user)
             
@@ -162,13 +190,53 @@ class ChangePasswordView(generics.UpdateAPIView):
 class ProductCreateView(generics.CreateAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer  
-    authentication_classes = [TokenAuthentication,authentication.SessionAuthentication]
+    authentication_classes = [CachedTokenAuthentication,authentication.SessionAuthentication]
     permission_classes = [permissions.IsAdminUser,IsAuthenticated]
     
     def perform_create(self, serializer):
         serializer.save()
     
     
+class ProductImportView(APIView):
+    """
+    Create or update products, matched on sku, from a CSV, NDJSON or JSON
+    array body (or a multipart "file" upload). The input is read as a
+    stream and row errors are reported by 0-based index.
+    """
+    authentication_classes = [CachedTokenAuthentication, authentication.SessionAuthentication]
+    permission_classes = [IsAuthenticated, permissions.IsAdminUser]
+    formats = {"text/csv": "csv", "application/x-ndjson": "ndjson", "application/json": "json"}
+    extensions = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".json": "json"}
+
+    def post(self, request):
+        media_type = request.content_type.split(";")[0].strip().lower()
+        if media_type == "multipart/form-data":
+            upload = request.FILES.get("file")
+            if upload is None:
+                return Response({"error": "Upload the catalog as the 'file' field"}, status=status.HTTP_400_BAD_REQUEST)
+            file_format = self.extensions.get(os.path.splitext(upload.name)[1].lower())
+            stream = upload
+        else:
+            file_format = self.formats.get(media_type)
+            stream = request.stream
+        if file_format is None:
+            return Response(
+                {"error": f"Send {', '.join(self.formats)} or upload a {', '.join(self.extensions)} file"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        if stream is None:
+            return Response({"error": "No products supplied"}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = import_products(stream, file_format)
+        if "error" in report:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif report["failed"]:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_200_OK
+        return Response(report, status=response_status)
+
+
 #Retrieving all product from the database
 # @api_view(["GET"])
 # def product(request):
@@ -182,9 +250,12 @@ class ProductCreateView(generics.CreateAPIView):
 #         serialer = ProductSerializer(products,many=True).data
 #         return Response(serialer)
         
-class ProductListView(generics.ListAPIView):
+class ProductListView(CachedResponseMixin, StreamingListMixin, generics.ListAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
+    cache_route = "products"
+    authentication_classes = [CachedTokenAuthentication,authentication.SessionAuthentication]
     permission_classes = [IsAuthenticated,permissions.IsAdminUser] 
     
     
@@ -202,11 +273,44 @@ class ProductListView(generics.ListAPIView):
 #         serializer = ProductSerializer(product,many=False).data
 #         return Response(serializer)
     
-class ProductDetailView(generics.RetrieveAPIView):
-    authentication_classes = [TokenAuthentication]
+def parse_as_of(value):
+    """
+    Read ?as_of= as an ISO datetime, or a YYYY-MM-DD date meaning the end
+    of that day. Naive values are in the current timezone. Raises
+    ValueError with a client-facing message.
+    """
+    try:
+        if len(value) == 10:
+            return day_start(date.fromisoformat(value) + timedelta(days=1)) - timedelta(microseconds=1)
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError("as_of must be a date (YYYY-MM-DD) or an ISO 8601 datetime")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class ProductDetailView(CachedResponseMixin, generics.RetrieveAPIView):
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated] 
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    cache_route = "product"
+
+    def get_cache_namespaces(self):
+        return [f"product:{self.kwargs['pk']}"]
+
+    def retrieve(self, request, *args, **kwargs):
+        """?as_of= adds the stock level at that moment, from the stock ledger"""
+        as_of = request.query_params.get("as_of")
+        if as_of:
+            try:
+                as_of = parse_as_of(as_of)
+            except ValueError as exc:
+                raise ValidationError({"error": str(exc)})
+        product = self.get_object()
+        data = self.get_serializer(product).data
+        if as_of:
+            data["stock_as_of"] = {"as_of": as_of.isoformat(), "stock_quantity": product.quantity_left(as_of)}
+        return Response(data)
     
 #Updating Product    
     
@@ -235,7 +339,7 @@ class ProductUpdateView(generics.UpdateAPIView):
     
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAdminUser,IsAuthenticated]
     lookup_field = "pk"
     
@@ -263,7 +367,7 @@ class ProductUpdateView(generics.UpdateAPIView):
 #     )   
 
 class ProductDeleteView(generics.DestroyAPIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAdminUser]
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
@@ -273,29 +377,82 @@ class ProductDeleteView(generics.DestroyAPIView):
         super().perform_destroy(instance)
             
 
+ANALYTICS_BUCKETS = {
+    "day": F("day"),
+    "week": TruncWeek("day"),
+    "month": TruncMonth("day"),
+}
+
+
+def parse_analytics_params(params):
+    """
+    Read ?start=YYYY-MM-DD&end=YYYY-MM-DD&bucket=day|week|month, defaulting
+    to today. Raises ValueError with a client-facing message.
+    """
+    today = timezone.localdate()
+    try:
+        start = date.fromisoformat(params.get("start") or today.isoformat())
+        end = date.fromisoformat(params.get("end") or start.isoformat())
+    except ValueError:
+        raise ValueError("start and end must be dates in YYYY-MM-DD format")
+    if end < start:
+        raise ValueError("end must not be before start")
+    bucket = params.get("bucket", "day")
+    if bucket not in ANALYTICS_BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(ANALYTICS_BUCKETS)}")
+    return start, end, bucket
+
+
+def analytics_queryset(start, end, bucket):
+    return DailyProductSales.objects.filter(
+        day__range=(start, end),
+        sale_count__gt=0,
+    ).annotate(
+        period=ANALYTICS_BUCKETS[bucket]
+    ).values(
+        'period',
+        'product__id',
+        'product__product_name'
+    ).annotate(
+        total_quantity=Sum('quantity'),
+        total_revenue=Sum('revenue'),
+        unit_price_total=Sum('unit_price_total'),
+        sale_count=Sum('sale_count')
+    ).order_by('period', '-total_revenue')
+
+
+def analytics_row(row):
+    unit_price_total = row.pop('unit_price_total')
+    sale_count = row.pop('sale_count')
+    row['average_price'] = (unit_price_total / sale_count).quantize(Decimal('0.01'))
+    return row
+
+
+def analytics_response(start, end, bucket, sales):
+    response = {'start': start, 'end': end, 'bucket': bucket, 'sales': sales}
+    if start == end:
+        response['date'] = start
+    return response
+
+
 class SalesAnalyticsView(APIView):
     """View for sales analytics"""
     permission_classes = [IsSalesPersonOrAdmin]
-    authentication_classes = [TokenAuthentication]
-    
+    authentication_classes = [CachedTokenAuthentication]
+
     def get(self, request):
-        """Get daily sales analytics by product"""
-        today = timezone.now().date()
-        daily_sales = Sale.objects.filter(
-            date__date=today
-        ).values(
-            'product__id',
-            'product__product_name'
-        ).annotate(
-            total_quantity=Sum('quantity_sold'),
-            total_revenue=Sum('total_sale'),
-            average_price=Avg('unit_price')
-        ).order_by('-total_revenue')
+        """
+        Sales analytics by product, served from the DailyProductSales rollup.
+        Optional ?start=YYYY-MM-DD&end=YYYY-MM-DD&bucket=day|week|month,
+        defaulting to today.
+        """
+        try:
+            start, end, bucket = parse_analytics_params(request.GET)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({
-            'date': today,
-            'sales': daily_sales
-        })
+        sales = [analytics_row(row) for row in analytics_queryset(start, end, bucket)]
+        return Response(analytics_response(start, end, bucket, sales))
         
         
 #implementing search tonight  
@@ -306,36 +463,39 @@ class SalesAnalyticsView(APIView):
 def search(request):
     if request.method == "GET":
         searched = request.GET.get("searched")
+        # thumbnail URLs are built absolute from the request
+        context = {"request": request}
         
         if searched:
-            queryset = Product.objects.filter(
-                Q(name__icontains=searched) | Q(description__icontains=searched)
-            )
-            
-            serializer = ProductSerializer(queryset, many=True)
-            return Response({
-                "count": queryset.count(),
-                "results": serializer.data
-            }, status=status.HTTP_200_OK)
-        else:
-        
-            queryset = Product.objects.all()
-            serializer = ProductSerializer(queryset, many=True)
-            return Response({
-                "count": queryset.count(),
-                "results": serializer.data
-            }, status=status.HTTP_200_OK)
+            results = search_products(searched)
+            if wants_stream(request):
+                return stream_json(results, ProductSerializer, context=context)
+            paginator = SearchPagination()
+            page = paginator.paginate_queryset(results, request)
+            serializer = ProductSerializer(page, many=True, context=context)
+            return paginator.get_paginated_response(serializer.data)
+
+        queryset = Product.objects.all()
+        paginator = ProductCursorPagination()
+        if wants_stream(request):
+            return stream_json(queryset.order_by(*paginator.ordering), ProductSerializer, context=context)
+
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = ProductSerializer(page, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
 
 
 #Create category and delete 
-class CategoryListView(generics.ListAPIView):
-    queryset = Category.objects.all()
+class CategoryListView(CachedResponseMixin, StreamingListMixin, generics.ListAPIView):
+    queryset = Category.objects.select_related('product').with_sales_count()
     serializer_class = CategorySerializer
+    pagination_class = CategoryCursorPagination
+    cache_route = "categories"
     permission_classes = [IsAuthenticated,permissions.IsAdminUser] 
     
 
 class CategoryDetailView(generics.RetrieveAPIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated] 
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
@@ -345,14 +505,14 @@ class CategoryDetailView(generics.RetrieveAPIView):
 class CategoryCreateView(generics.CreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer  
-    authentication_classes = [TokenAuthentication,authentication.SessionAuthentication]
+    authentication_classes = [CachedTokenAuthentication,authentication.SessionAuthentication]
     permission_classes = [permissions.IsAdminUser]
     
     def perform_create(self, serializer):
         serializer.save()
         
 class CategoryDeleteView(generics.DestroyAPIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAdminUser]
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -361,21 +521,86 @@ class CategoryDeleteView(generics.DestroyAPIView):
     def perform_destroy(self, instance):
         super().perform_destroy(instance)  
         
-class SalesListView(generics.ListAPIView):
-    queryset = Sale.objects.all()
-    serializer_class = SaleSerializer(many=True)
-    permission_classes = [IsAuthenticated,permissions.IsAdminUser]        
+class SalesListView(StreamingListMixin, generics.ListAPIView):
+    """
+    Lists sales as .values() rows through SaleReadSerializer.
+    Optional filters: ?product=<id>&start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive).
+    """
+    serializer_class = SaleReadSerializer
+    pagination_class = SaleCursorPagination
+    permission_classes = [IsAuthenticated,permissions.IsAdminUser]
+
+    def get_queryset(self):
+        return filter_sales(Sale.objects.all(), self.request.query_params).values(*SALE_LIST_FIELDS)
+
+
+def filter_sales(queryset, params):
+    """Apply product and date range filters from query parameters"""
+    product = params.get("product")
+    try:
+        start = date.fromisoformat(params["start"]) if params.get("start") else None
+        end = date.fromisoformat(params["end"]) if params.get("end") else None
+        product = int(product) if product else None
+    except ValueError:
+        raise ValidationError({"error": "start and end must be YYYY-MM-DD and product an id"})
+    if product is not None:
+        queryset = queryset.filter(product_id=product)
+    if start:
+        queryset = queryset.filter(date__gte=day_start(start))
+    if end:
+        queryset = queryset.filter(date__lt=day_start(end + timedelta(days=1)))
+    return queryset
+
+
 class SalesCreateView(generics.CreateAPIView):
     queryset = Sale.objects.all()   
     serializer_class = SaleSerializer   
-    authentication_classes = [TokenAuthentication,authentication.SessionAuthentication]
+    authentication_classes = [CachedTokenAuthentication,authentication.SessionAuthentication]
     permission_classes = [permissions.IsAdminUser,IsAuthenticated]
     
     def perform_create(self, serializer):
         serializer.save()    
         
+class SalesBulkCreateView(APIView):
+    """
+    Create a batch of sales from a JSON array or an NDJSON body.
+    Invalid rows are reported by index without aborting the rest.
+    """
+    authentication_classes = [CachedTokenAuthentication,authentication.SessionAuthentication]
+    permission_classes = [permissions.IsAdminUser,IsAuthenticated]
+    parser_classes = [JSONParser, NDJSONParser]
+    max_batch_size = 1000
+
+    def post(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({"error": "Expected a list of sales"}, status=status.HTTP_400_BAD_REQUEST)
+        if not rows:
+            return Response({"error": "No sales supplied"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.max_batch_size:
+            return Response(
+                {"error": f"A batch may contain at most {self.max_batch_size} sales"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = SaleSerializer(data=rows, many=True, context={"request": request})
+        serializer.is_valid()
+        sales = serializer.save() if serializer.validated_data else []
+        errors = serializer.item_errors
+
+        if not sales:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({
+            "created": SaleSerializer(sales, many=True).data,
+            "errors": errors,
+        }, status=response_status)
+
 class SalesDeleteView(generics.DestroyAPIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAdminUser]
     queryset = Sale.objects.all()
     serializer_class = SaleSerializer
@@ -392,4 +617,63 @@ class SalesDeleteView(generics.DestroyAPIView):
     
     
     
-    
\ No newline at end of file
+    
+
+
+class AlertListView(generics.ListAPIView):
+    """
+    Low-stock alerts, newest first. ?status=open (default), resolved or all;
+    optional ?product=<id>.
+    """
+    serializer_class = AlertSerializer
+    pagination_class = AlertCursorPagination
+    authentication_classes = [CachedTokenAuthentication, authentication.SessionAuthentication]
+    permission_classes = [IsSalesPersonOrAdmin]
+
+    def get_queryset(self):
+        queryset = Alert.objects.select_related('product')
+        alert_status = self.request.query_params.get("status", Alert.OPEN)
+        if alert_status not in (Alert.OPEN, Alert.RESOLVED, "all"):
+            raise ValidationError({"error": "status must be open, resolved or all"})
+        if alert_status != "all":
+            queryset = queryset.filter(status=alert_status)
+        product = self.request.query_params.get("product")
+        if product:
+            try:
+                queryset = queryset.filter(product_id=int(product))
+            except ValueError:
+                raise ValidationError({"error": "product must be an id"})
+        return queryset
+
+
+accepts_gzip = re.compile(r"\bgzip\b")
+
+
+class ExportView(APIView):
+    """
+    Streams every sale or product as ?output=csv (default) or ndjson,
+    gzipped when the client accepts it.
+    Optional filters: ?product=<id>&start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive).
+    """
+    authentication_classes = [CachedTokenAuthentication, authentication.SessionAuthentication]
+    permission_classes = [IsAuthenticated, permissions.IsAdminUser]
+    kind = None
+
+    def get(self, request):
+        output = request.query_params.get("output", "csv")
+        if output not in CONTENT_TYPES:
+            raise ValidationError({"error": f"output must be one of {', '.join(CONTENT_TYPES)}"})
+        try:
+            filters = parse_filters(request.query_params)
+        except ValueError as exc:
+            raise ValidationError({"error": str(exc)})
+
+        chunks = export_chunks(self.kind, output, **filters)
+        response = StreamingHttpResponse(content_type=CONTENT_TYPES[output])
+        if accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+            chunks = gzip_chunks(chunks)
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ("Accept-Encoding",))
+        response["Content-Disposition"] = f'attachment; filename="{self.kind}.{output}"'
+        response.streaming_content = chunks
+        return response